@@ -9,7 +9,9 @@ logging.basicConfig(filename='word.log', level=logging.DEBUG)
 sys.path.append(os.path.abspath('./ECDICT/'))
 import stardict
 if not os.path.exists("dict.db") and os.path.exists("./ECDICT/ecdict.csv"):
-    stardict.convert_dict("dict.db", "./ECDICT/ecdict.csv")
+    # 转换很慢，改用独立的导入命令：多进程解析，可以中断后继续
+    print("dict.db not found, run: python -m core.ecdict ECDICT/ecdict.csv dict.db")
+    sys.exit(1)
 
 # Create a cursor object to execute SQL commands
 
@@ -7,11 +7,13 @@ appendPaths = [
 extendPaths = [os.path.abspath(os.path.join(os.path.dirname(__file__), path)) for path in appendPaths]
 sys.path.extend(extendPaths)
 
-from .database import Database, UserTable, BookTable
+from .database import ConnectionManager, Database, UserTable, LibraryTable, BookTable
+from .journal import ProgressJournal
+from .dictionary import Dictionary, dictionary
 from .book import Book
 from .word import Word, CharSequence
 
 def LoadConfig(file: str | os.PathLike) -> None:
     pass
 
-__all__ = ["Book", "Word", "CharSequence", "LoadConfig", "Database", "UserTable", "BookTable"]
\ No newline at end of file
+__all__ = ["Book", "Word", "CharSequence", "LoadConfig", "Dictionary", "dictionary", "ConnectionManager", "Database", "UserTable", "LibraryTable", "BookTable", "ProgressJournal"]
\ No newline at end of file
@@ -0,0 +1,180 @@
+from __future__ import annotations
+import io
+import os
+import logging
+import threading
+from collections import deque
+from typing import Callable, Iterable, TYPE_CHECKING
+import pygame
+import utils
+
+if TYPE_CHECKING:
+    from .word import Word
+
+class AudioResolver:
+    '''
+    按顺序查找单词的发音，找到就不再往下找：
+        pack  : ResourceManager 挂载的发音包（phonetic/en.pak，没有时查 phonetic/en.zip）
+        tree  : spider.py 下载到 phonetic/en/<md5[:2]>/<word>.mp3 的文件
+        cache : TTS 的磁盘缓存
+        tts   : 合成（见 utils.ttsbackend）
+    前两种的相对路径优先用词典里的 audio 字段，没有时按 youdao.path 的规则计算。
+    '''
+    sources = ("pack", "tree", "cache", "tts")
+
+    def __init__(self, root: str | os.PathLike = os.path.join("phonetic", "en"), tts: utils.SimpleTTS | None = None):
+        self._root = root
+        self._tts = tts or utils.SimpleTTS()
+        self._youdao = utils.youdao()
+        self._lock = threading.Lock()
+        self._hits: dict[str, int] = dict.fromkeys(self.sources + ("miss",), 0)
+
+    def _count(self, source: str) -> None:
+        with self._lock:
+            self._hits[source] += 1
+
+    def Stats(self) -> dict[str, int]:
+        with self._lock:
+            return dict(self._hits)
+
+    def Load(self, word: Word) -> bytes | None:
+        pathname = os.path.join(self._root, word.content.get("audio") or self._youdao.path(word.word))
+
+        data = utils.ResourceManager.loadPronunciation(word.word)
+        if data is None:
+            data = utils.ResourceManager.loadArchived(pathname)
+        if data is not None:
+            self._count("pack")
+            return data
+
+        if os.path.isfile(pathname):
+            self._count("tree")
+            with open(pathname, "rb") as f:
+                return f.read()
+
+        buffer = self._tts.cached(word.word)
+        if buffer is not None:
+            self._count("cache")
+            return buffer.getvalue()
+
+        ret, buffer = self._tts.synthesize(word.word)
+        if ret and buffer is not None:
+            self._count("tts")
+            return buffer.getvalue()
+
+        self._count("miss")
+        return None
+
+# 进程内共享的发音查找
+resolver = AudioResolver()
+
+class AudioPrefetcher:
+    '''
+    单词发音的预取线程。
+
+    按单词迭代的顺序，只为接下来的 lookahead 个单词准备好发音，合成和解码都在后台线程里完成，
+    Word.play 不会阻塞画面刷新，加载单词书的时间也不再和单词数量有关。
+    '''
+    def __init__(self, lookahead: int = 5, loader: Callable[[Word], bytes | None] = resolver.Load):
+        self._lookahead = lookahead
+        self._loader = loader
+        self._queue: deque[Word] = deque(maxlen=lookahead)
+        self._cond = threading.Condition()
+        self._thread: threading.Thread | None = None
+        self._closed = False
+        # 当前和接下来的单词的声音固定在 utils.SoundCache 里，不会被淘汰
+        self._pinned: list[tuple[str, str]] = []
+
+    @property
+    def lookahead(self) -> int:
+        return self._lookahead
+
+    def Schedule(self, words: Iterable[Word]) -> None:
+        '''
+        用接下来要背的单词替换等待队列，已经准备好的单词会被跳过，最先要用的排在最前面。
+        '''
+        words = list(words)[:self._lookahead]
+        with self._cond:
+            pinned = [word.key for word in words]
+            for key in pinned:
+                utils.SoundCache.Pin(key)
+            for key in self._pinned:
+                utils.SoundCache.Unpin(key)
+            self._pinned = pinned
+
+            self._queue.clear()
+            for word in words:
+                if not word.ready() and word not in self._queue:
+                    self._queue.append(word)
+
+            self._start()
+            self._cond.notify()
+
+    def Request(self, word: Word) -> None:
+        '''
+        马上要播放但还没准备好的单词，插到队列最前面。
+        '''
+        with self._cond:
+            if word.ready():
+                # 在检查和请求之间刚好准备好了
+                word.prepared()
+                return
+            if len(self._queue) > 0 and self._queue[0] is word:
+                return
+            if word in self._queue:
+                self._queue.remove(word)
+            self._queue.appendleft(word)
+
+            self._start()
+            self._cond.notify()
+
+    def _start(self) -> None:
+        if self._thread is None and not self._closed:
+            self._thread = threading.Thread(target=self._run, name="AudioPrefetcher", daemon=True)
+            self._thread.start()
+
+    def Close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._queue.clear()
+            for key in self._pinned:
+                utils.SoundCache.Unpin(key)
+            self._pinned = []
+            self._cond.notify()
+
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while len(self._queue) == 0 and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                word = self._queue.popleft()
+
+            if word.ready():
+                word.prepared()
+                continue
+
+            if word.loaded():
+                # 解码后的声音被淘汰了，重新解码
+                word.prepared()
+                continue
+
+            data: bytes | None = None
+            sound: pygame.mixer.Sound | None = None
+            try:
+                data = self._loader(word)
+                if data is not None:
+                    if pygame.mixer.get_init():
+                        sound = pygame.mixer.Sound(io.BytesIO(data))
+            except Exception as e:
+                logging.error(f"{type(e)} - {e}")
+
+            word.setSound(data, sound)
+
+# 进程内共享的预取线程
+prefetcher = AudioPrefetcher()
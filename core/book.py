@@ -1,12 +1,28 @@
 import os
 import random
-import stardict
 import logging
 import hashlib
+from typing import Iterator
 from . import database
+from . import scheduler
+from .dictionary import Dictionary, dictionary
+from .journal import ProgressJournal
+from .audio import prefetcher
 from .word import Word
 
-dictionary = stardict.StarDict("dict.db")
+def ReadWords(pathname: str | os.PathLike) -> Iterator[str]:
+    '''
+    逐行读取单词书，去掉首尾空白、合并中间多余的空格，跳过空行和重复的单词。
+    '''
+    seen: set[str] = set()
+    with open(pathname, "r", encoding="utf-8-sig") as f:
+        for line in f:
+            word = " ".join(line.split())
+            if word == "" or word in seen:
+                continue
+
+            seen.add(word)
+            yield word
 
 class Book:
     '''
@@ -19,16 +35,20 @@ class Book:
         self._iter = 0
         self._round = 0
         self._db = database.Database("users.db")        
+        self._journal = ProgressJournal.Get("users.db")
         self._table: database.BookTable | None = None
+        # word -> (interval, ease, reps)，单词背会时用来计算下一次复习时间
+        self._schedules: dict[str, tuple[float, float, int]] = {}
 
     def __tablename(self, user: str, pathname: str | os.PathLike) -> str:
         sha1 = hashlib.sha1()
         sha1.update(str(pathname).encode())
         return f'{user}_{sha1.hexdigest()}'
 
-    def __new(self, user: str, pathname: str | os.PathLike, dictionary: stardict.StarDict)-> bool:
+    def __new(self, user: str, pathname: str | os.PathLike, dictionary: Dictionary, reimport: bool = False)-> bool:
         '''
         从文件中新建单词书，单词每行一个，也可以是词组或固定搭配。
+        reimport 为 True 时重新导入文件中的单词，已有单词的进度保持不变。
         '''
         if not os.path.exists(pathname):
             return False
@@ -36,43 +56,57 @@ class Book:
         # transform the pathname to absolute path
         pathname = os.path.abspath(pathname)
 
-        self._table = database.BookTable(self._db, self.__tablename(user, pathname))
-
-        if self._table.IsExists():
-            return True
+        users = database.UserTable(self._db)
+        users.Create()
+        library = database.LibraryTable(self._db)
+        library.Create()
 
-        # create the database table
+        userId = users.QueryId(user)
+        bookId = library.QueryId(pathname)
+        self._table = database.BookTable(self._db, userId, bookId)
         self._table.Create()
+
+        # 旧版本每本书单独一张表，第一次打开时并入 progress 表
+        database.MigrateLegacyTable(self._db, self.__tablename(user, pathname), userId, bookId)
+
+        if self._table.IsExists() and not reimport:
+            return True
         
         # initialize the book table
-        with open(pathname, "r", encoding="utf-8") as f:
-            try:
-                lines = f.readlines()
-                words = [ln[:-1] for ln in lines]
-                self._table.Insert(words)
-                
-            except Exception as e:
-                print(e)
+        try:
+            self._table.Insert(ReadWords(pathname))
+        except Exception as e:
+            logging.error(f"{type(e)} - {e}")
 
         return True
     
     def isEmpty(self):
         return len(self._words) == 0
     
-    def load(self, user: str, pathname: str, totalWordCount = 200, newWordCount: int = 50) -> bool:
+    def load(self, user: str, pathname: str, totalWordCount = 200, newWordCount: int = 50, reimport: bool = False) -> bool:
         '''
         加载背过的单词书进行复习
         '''
         try:
-            self.__new(user, pathname, dictionary)
+            self.__new(user, pathname, dictionary, reimport)
             if self._table is None:
                 return False
             
+            # 先把还没写回的进度落盘，保证读到的是最新数据
+            self._journal.Flush()
             newWords = self._table.QueryNewWords(newWordCount)
             reviewWords = self._table.QueryReviewWords(totalWordCount - len(newWords))
+            words: list[str] = []
+            for row in newWords + reviewWords:
+                if row[0] not in self._schedules:
+                    self._schedules[row[0]] = (row[4], row[5], row[6])
+                    words.append(row[0])
+
+            # 一次查出所有单词的释义，不再逐个查询词典
+            contents = dictionary.QueryBatch(words)
             # audios = {}
-            for word in set([row[0] for row in newWords + reviewWords]):
-                w = Word(word, dictionary.query(word))
+            for word in words:
+                w = Word(word, contents.get(word))
                 # info = 
                 # if info is not None:
                 #     if info["audio"] is None or info["audio"] == "":
@@ -93,6 +127,8 @@ class Book:
             # Update the audio to db if audio is not exists.
             # if len(audios) > 0:
             #     self.updateAudio(audios)
+
+            prefetcher.Schedule(self.peek(prefetcher.lookahead))
         except Exception as e:
             logging.error(f"{type(e)} - {e}")
             return False
@@ -125,9 +161,9 @@ class Book:
             for idx, word in enumerate(self._words):
                 if word.wrong < word.right:
                     if self._table is not None:
-                        self._table.IncRight(word.word, word.right)
-                        self._table.IncWrong(word.word, word.wrong)
-                        self._table.IncBingo(word.word, 1)
+                        interval, ease, reps = self._schedules.get(word.word, (0, scheduler.DEFAULT_EASE, 0))
+                        schedule = scheduler.Review(interval, ease, reps, scheduler.Quality(word.wrong))
+                        self._journal.Add(self._table.userId, self._table.bookId, word.word, word.wrong, word.right, 1, schedule)
                     continue
                 
                 words.append(word)
@@ -138,8 +174,29 @@ class Book:
 
         word = self._words[self._iter % len(self._words)]
         self._iter += 1
+        # 当前单词和接下来的几个单词在后台准备发音
+        prefetcher.Schedule([word] + self.peek(prefetcher.lookahead - 1))
         return word
+
+    def peek(self, count: int) -> list[Word]:
+        '''
+        按迭代顺序返回接下来的 count 个单词（不包括已经背会、下一轮会被剔除的单词）。
+        '''
+        words: list[Word] = []
+        for i in range(min(count, len(self._words))):
+            index = (self._iter + i) % len(self._words)
+            word = self._words[index]
+            if index < self._iter % len(self._words) and word.wrong < word.right:
+                continue
+            words.append(word)
+        return words
     
+    def flush(self, wait: bool = False):
+        '''
+        把背单词的进度写回数据库，切换场景时调用。
+        '''
+        self._journal.Flush(wait)
+
     def reset(self):
         self._iter = 0
         self._round = 0
@@ -149,6 +206,7 @@ class Book:
             word.bingo = 0
         # 重排顺序
         random.shuffle(self._words)
+        prefetcher.Schedule(self.peek(prefetcher.lookahead))
     
     def index(self):
         return self._iter % len(self._words)
@@ -1,85 +1,334 @@
+import re
+import time
+import atexit
+import logging
 import sqlite3
-from typing import Any, Tuple
+import threading
+from typing import Any, Callable, Iterable, Tuple
 
 _is_table_exists_query = """
     SELECT name FROM sqlite_master WHERE type='table' AND name=?;
 """
 
+_table_columns_query = """
+    PRAGMA table_info({tablename})
+"""
+
 _user_create_table = """
 CREATE TABLE IF NOT EXISTS users (
-    name TEXT PRIMARY KEY,
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
     password TEXT NOT NULL
 );
 """
 
+# 旧版本的 users 表以 name 为主键，没有稳定的 id，需要重建
+_user_rename_legacy = """
+    ALTER TABLE users RENAME TO users_legacy
+"""
+
+_user_copy_legacy = """
+    INSERT INTO users (name, password) SELECT name, password FROM users_legacy
+"""
+
+_user_drop_legacy = """
+    DROP TABLE users_legacy
+"""
+
+# 不能用 INSERT OR REPLACE，否则 id 会变，进度就对不上了
 _user_insert = """
-    INSERT OR REPLACE INTO users (name, password)
+    INSERT INTO users (name, password)
     VALUES (?, ?)
+    ON CONFLICT(name) DO UPDATE SET password = excluded.password
+"""
+
+_user_insert_name = """
+    INSERT INTO users (name, password)
+    VALUES (?, '')
+    ON CONFLICT(name) DO NOTHING
 """
 
 _user_query = """
     SELECT name, password FROM users
 """
 
-_book_create_table = """
-CREATE TABLE IF NOT EXISTS {tablename} (
-    word TEXT PRIMARY KEY,
+_user_query_id = """
+    SELECT id FROM users WHERE name = ?
+"""
+
+# 每本书每个状态的单词数，走 progress_user_due 索引
+_user_progress_query = """
+    SELECT book_id,
+        COUNT(*) AS total,
+        SUM(due IS NULL) AS new,
+        SUM(due <= ?) AS due
+    FROM progress
+    WHERE user_id = ?
+    GROUP BY book_id
+"""
+
+# 所有书里到期的单词，最早到期的优先
+_user_review_query = """
+    SELECT books.path, words.word, progress.due
+    FROM progress
+    JOIN words ON words.id = progress.word_id
+    JOIN books ON books.id = progress.book_id
+    WHERE progress.user_id = ? AND progress.due <= ?
+    ORDER BY progress.due
+    LIMIT ?
+"""
+
+_library_create_table = """
+CREATE TABLE IF NOT EXISTS books (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE
+);
+"""
+
+_library_insert = """
+    INSERT INTO books (path)
+    VALUES (?)
+    ON CONFLICT(path) DO NOTHING
+"""
+
+_library_query_id = """
+    SELECT id FROM books WHERE path = ?
+"""
+
+_words_create_table = """
+CREATE TABLE IF NOT EXISTS words (
+    id INTEGER PRIMARY KEY,
+    word TEXT NOT NULL UNIQUE
+);
+"""
+
+_progress_create_table = """
+CREATE TABLE IF NOT EXISTS progress (
+    user_id INTEGER NOT NULL,
+    book_id INTEGER NOT NULL,
+    word_id INTEGER NOT NULL,
     wrong INTEGER NOT NULL DEFAULT 0,
     right INTEGER NOT NULL DEFAULT 0,
-    bingo INTEGER NOT NULL DEFAULT 0,    
-    content TEXT DEFAULT NULL,
-    update_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
+    bingo INTEGER NOT NULL DEFAULT 0,
+    due REAL DEFAULT NULL,
+    interval REAL NOT NULL DEFAULT 0,
+    ease REAL NOT NULL DEFAULT 2.5,
+    reps INTEGER NOT NULL DEFAULT 0,
+    update_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, book_id, word_id)
+) WITHOUT ROWID;
 """
 
-_book_insert_word = """
-    INSERT OR REPLACE INTO {tablename} (word)
+# 加载单词书用的覆盖索引，查询新单词和到期单词都不用回表
+_progress_create_book_index = """
+CREATE INDEX IF NOT EXISTS progress_book_due
+ON progress (user_id, book_id, due, word_id, wrong, right, bingo, interval, ease, reps);
+"""
+
+# 跨书的复习队列和统计
+_progress_create_user_index = """
+CREATE INDEX IF NOT EXISTS progress_user_due ON progress (user_id, due, book_id);
+"""
+
+_words_insert = """
+    INSERT INTO words (word)
     VALUES (?)
+    ON CONFLICT(word) DO NOTHING
+"""
+
+# 重复导入时保留已有的 wrong/right/bingo 计数
+_book_insert_word = """
+    INSERT INTO progress (user_id, book_id, word_id)
+    SELECT ?, ?, id FROM words WHERE word = ?
+    ON CONFLICT DO NOTHING
+"""
+
+_book_is_exists_query = """
+    SELECT 1 FROM progress WHERE user_id = ? AND book_id = ? LIMIT 1
 """
 
 # 选择?个新单词
 _book_load_query = """
-    SELECT word, wrong, right, bingo
-    FROM {tablename}
-    WHERE wrong = 0 AND right = 0
+    SELECT words.word, progress.wrong, progress.right, progress.bingo, progress.interval, progress.ease, progress.reps
+    FROM progress
+    JOIN words ON words.id = progress.word_id
+    WHERE progress.user_id = ? AND progress.book_id = ? AND progress.due IS NULL
     LIMIT ?
 """
 
-# 选择?个需要复习的单词
+# 选择?个已经到期需要复习的单词，最早到期的优先
 _book_review_query = """
-    SELECT word, wrong, right, bingo
-    FROM {tablename}
-    WHERE wrong > right OR bingo < 3  -- 假设bingo小于3的单词需要复习
-    ORDER BY wrong DESC, bingo ASC
+    SELECT words.word, progress.wrong, progress.right, progress.bingo, progress.interval, progress.ease, progress.reps
+    FROM progress
+    JOIN words ON words.id = progress.word_id
+    WHERE progress.user_id = ? AND progress.book_id = ? AND progress.due <= ?
+    ORDER BY progress.due
     LIMIT ?;
 """
 
-_book_update_wrong = """
-    UPDATE {tablename} SET wrong = wrong + ? where word = ?
+_book_word_id = """
+    (SELECT id FROM words WHERE word = ?)
+"""
+
+_book_update_wrong = f"""
+    UPDATE progress SET wrong = wrong + ?
+    WHERE user_id = ? AND book_id = ? AND word_id = {_book_word_id}
+"""
+
+_book_update_right = f"""
+    UPDATE progress SET right = right + ?
+    WHERE user_id = ? AND book_id = ? AND word_id = {_book_word_id}
 """
 
-_book_update_right = """
-    UPDATE {tablename} SET right = right + ? where word = ?
+_book_update_bingo = f"""
+    UPDATE progress SET bingo = bingo + ?
+    WHERE user_id = ? AND book_id = ? AND word_id = {_book_word_id}
 """
 
-_book_update_bingo = """
-    UPDATE {tablename} SET bingo = bingo + ? where word = ?
+_book_update_progress = f"""
+    UPDATE progress
+    SET wrong = wrong + ?, right = right + ?, bingo = bingo + ?, update_time = CURRENT_TIMESTAMP,
+        due = COALESCE(?, due), interval = COALESCE(?, interval), ease = COALESCE(?, ease), reps = COALESCE(?, reps)
+    WHERE user_id = ? AND book_id = ? AND word_id = {_book_word_id}
 """
 
+# 旧版本每个用户的每本书一张表，表名是 {user}_{sha1(path)}
+_legacy_tablename = re.compile(r"^(.+)_([0-9a-f]{40})$")
+
+_legacy_tables_query = """
+    SELECT name FROM sqlite_master WHERE type='table'
+"""
+
+_legacy_copy_words = """
+    INSERT INTO words (word) SELECT word FROM {tablename} WHERE true
+    ON CONFLICT(word) DO NOTHING
+"""
+
+_legacy_copy_progress = """
+    INSERT INTO progress (user_id, book_id, word_id, wrong, right, bingo, due, interval, ease, reps, update_time)
+    SELECT ?, ?, words.id, legacy.wrong, legacy.right, legacy.bingo, {due}, {interval}, {ease}, {reps}, legacy.update_time
+    FROM {tablename} AS legacy
+    JOIN words ON words.word = legacy.word
+    WHERE true
+    ON CONFLICT DO UPDATE SET
+        wrong = wrong + excluded.wrong,
+        right = right + excluded.right,
+        bingo = bingo + excluded.bingo,
+        due = COALESCE(excluded.due, due),
+        interval = excluded.interval,
+        ease = excluded.ease,
+        reps = excluded.reps
+"""
+
+_legacy_count_query = """
+    SELECT COUNT(*) FROM {tablename}
+"""
+
+_legacy_drop_table = """
+    DROP TABLE {tablename}
+"""
+
+class ConnectionManager:
+    '''
+    进程内共享的数据库连接，每个线程每个数据库一个连接。
+
+    连接打开时切换到 WAL 模式并设置 synchronous、cache_size 和 busy_timeout，
+    这样渲染线程、后台写线程和多个程序实例可以同时读写，不会频繁遇到 "database is locked"。
+    '''
+    timeout: float = 5.0            # busy_timeout，单位秒
+    cache_size: int = -8192         # 负数表示 KiB，即 8MB 页缓存
+    cached_statements: int = 256    # 每个连接缓存的预编译语句数
+    retries: int = 5                # 超过 busy_timeout 后的重试次数
+
+    _local = threading.local()
+    _connections: list[sqlite3.Connection] = []
+    _lock = threading.Lock()
+
+    @classmethod
+    def Get(cls, dbname: str) -> sqlite3.Connection:
+        connections: dict[str, sqlite3.Connection] | None = getattr(cls._local, "connections", None)
+        if connections is None:
+            connections = {}
+            cls._local.connections = connections
+
+        connection = connections.get(dbname)
+        if connection is None:
+            connection = cls.__open(dbname)
+            connections[dbname] = connection
+            with cls._lock:
+                cls._connections.append(connection)
+        return connection
+
+    @classmethod
+    def __open(cls, dbname: str) -> sqlite3.Connection:
+        # check_same_thread=False 只是为了退出时能在主线程统一关闭，平时每个线程只用自己的连接
+        connection = sqlite3.connect(dbname, timeout=cls.timeout, cached_statements=cls.cached_statements, check_same_thread=False)
+        cls.Retry(connection.execute, "PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute(f"PRAGMA cache_size={int(cls.cache_size)}")
+        return connection
+
+    @classmethod
+    def Retry(cls, func: Callable[..., Any], *args) -> Any:
+        '''
+        数据库被其他连接锁住超过 busy_timeout 时退避重试。
+        '''
+        delay = 0.05
+        for attempt in range(cls.retries + 1):
+            try:
+                return func(*args)
+            except sqlite3.OperationalError as e:
+                message = str(e)
+                if attempt == cls.retries or ("locked" not in message and "busy" not in message):
+                    raise
+                logging.warning(f"{message}, retry in {delay:.2f}s")
+                time.sleep(delay)
+                delay *= 2
+
+    @classmethod
+    def CloseAll(cls) -> None:
+        with cls._lock:
+            connections = list(cls._connections)
+            cls._connections.clear()
+
+        for connection in connections:
+            try:
+                connection.close()
+            except Exception as e:
+                logging.error(f"{type(e)} - {e}")
+
+        cls._local = threading.local()
+
 class Database:
     def __init__(self, dbname: str):
-        self._connection = sqlite3.connect(dbname)
+        self._connection = ConnectionManager.Get(dbname)
         self._cursor = self._connection.cursor()
 
+    def __retry(self, func: Callable[..., Any], *args) -> Any:
+        # 事务中途被锁时重试单条语句没有意义，只在事务开始前或提交时重试
+        if self._connection.in_transaction:
+            return func(*args)
+        return ConnectionManager.Retry(func, *args)
+
     def execute(self, query: str, params: Tuple[Any, ...] | list[Any] | dict[str, Any] = (), /):
-        self._cursor.execute(query, params)
-    
+        self.__retry(self._cursor.execute, query, params)
+
+    def executemany(self, query: str, params: Iterable[Tuple[Any, ...] | list[Any] | dict[str, Any]], /):
+        self.__retry(self._cursor.executemany, query, params)
+
     def query(self, query: str, params: Tuple[Any, ...] | list[Any] | dict[str, Any] = (), /) -> list[Any]:
-        self._cursor.execute(query, params)
+        self.__retry(self._cursor.execute, query, params)
         return self._cursor.fetchall()
-    
+
     def commit(self):
-        self._connection.commit()
+        ConnectionManager.Retry(self._connection.commit)
+
+    def rollback(self):
+        self._connection.rollback()
+
+    def close(self):
+        # 连接由 ConnectionManager 统一管理，这里只关闭游标
+        self._cursor.close()
 
 class Table:
     def __init__(self, database: Database, tablename: str):
@@ -89,7 +338,10 @@ class Table:
     def IsExists(self) -> bool:
         # Query to check if table exists
         return len(self._database.query(_is_table_exists_query, (self._tablename,)) or []) > 0
-    
+
+    def Columns(self) -> list[str]:
+        return [row[1] for row in self._database.query(_table_columns_query.format(tablename=self._tablename))]
+
     @property
     def tablename(self):
         return self._tablename
@@ -99,7 +351,13 @@ class UserTable(Table):
         super().__init__(database, "users")
 
     def Create(self):
-        self._database.execute(_user_create_table)
+        if self.IsExists() and "id" not in self.Columns():
+            self._database.execute(_user_rename_legacy)
+            self._database.execute(_user_create_table)
+            self._database.execute(_user_copy_legacy)
+            self._database.execute(_user_drop_legacy)
+        else:
+            self._database.execute(_user_create_table)
         self._database.commit()
 
     def Insert(self, name: str, password: str):
@@ -109,37 +367,169 @@ class UserTable(Table):
     def QueryAll(self)->list[str]:
         return self._database.query(_user_query)
 
-class BookTable(Table):
-    def __init__(self, database: Database, tablename: str):
-        super().__init__(database, tablename)
+    def QueryId(self, name: str) -> int:
+        '''
+        获取用户的 id，用户不存在时自动创建。
+        '''
+        self._database.execute(_user_insert_name, (name,))
+        self._database.commit()
+        return self._database.query(_user_query_id, (name,))[0][0]
+
+    def QueryProgress(self, userId: int, now: float | None = None) -> list[Any]:
+        '''
+        每本书的 (book_id, total, new, due) 统计。
+        '''
+        if now is None:
+            now = time.time()
+        return self._database.query(_user_progress_query, (now, userId))
+
+    def QueryReviewWords(self, userId: int, count: int, now: float | None = None) -> list[Any]:
+        '''
+        所有书里已经到期的单词 (path, word, due)。
+        '''
+        if now is None:
+            now = time.time()
+        return self._database.query(_user_review_query, (userId, now, count))
+
+class LibraryTable(Table):
+    '''
+    单词书文件的登记表，给每个文件一个稳定的 id。
+    '''
+    def __init__(self, database: Database):
+        super().__init__(database, "books")
 
     def Create(self):
-        self._database.execute(_book_create_table.format(tablename=self.tablename))
+        self._database.execute(_library_create_table)
         self._database.commit()
 
-    def Insert(self, words: list[str]):
-        for word in words:
-            try:
-                self._database.execute(_book_insert_word.format(tablename=self.tablename), (word,))
-            except Exception as e:
-                print(e)
+    def QueryId(self, pathname: str) -> int:
+        self._database.execute(_library_insert, (pathname,))
+        self._database.commit()
+        return self._database.query(_library_query_id, (pathname,))[0][0]
 
+class BookTable(Table):
+    '''
+    一个用户在一本书上的学习进度，所有用户和书共用 progress 表。
+    '''
+    def __init__(self, database: Database, userId: int, bookId: int):
+        super().__init__(database, "progress")
+        self._userId = userId
+        self._bookId = bookId
+
+    @property
+    def userId(self) -> int:
+        return self._userId
+
+    @property
+    def bookId(self) -> int:
+        return self._bookId
+
+    def Create(self):
+        self._database.execute(_words_create_table)
+        self._database.execute(_progress_create_table)
+        self._database.execute(_progress_create_book_index)
+        self._database.execute(_progress_create_user_index)
         self._database.commit()
 
+    def IsExists(self) -> bool:
+        return len(self._database.query(_book_is_exists_query, (self._userId, self._bookId))) > 0
+
+    def Insert(self, words: Iterable[str], batchSize: int = 1000) -> int:
+        '''
+        分批导入单词，所有批次在同一个事务里提交，失败时整体回滚。返回处理的单词数。
+        '''
+        count = 0
+        batch: list[str] = []
+        try:
+            for word in words:
+                batch.append(word)
+                if len(batch) >= batchSize:
+                    self.__insert(batch)
+                    count += len(batch)
+                    batch.clear()
+
+            if len(batch) > 0:
+                self.__insert(batch)
+                count += len(batch)
+
+            self._database.commit()
+        except Exception:
+            self._database.rollback()
+            raise
+
+        return count
+
+    def __insert(self, words: list[str]):
+        self._database.executemany(_words_insert, [(word,) for word in words])
+        self._database.executemany(_book_insert_word, [(self._userId, self._bookId, word) for word in words])
+
     def IncWrong(self, word: str, count: int = 1):
-        self._database.execute(_book_update_wrong.format(tablename=self.tablename), (count, word))
+        self._database.execute(_book_update_wrong, (count, self._userId, self._bookId, word))
         self._database.commit()
 
     def IncRight(self, word: str, count: int = 1):
-        self._database.execute(_book_update_right.format(tablename=self.tablename), (count, word))
+        self._database.execute(_book_update_right, (count, self._userId, self._bookId, word))
         self._database.commit()
 
     def IncBingo(self, word: str, count: int = 1):
-        self._database.execute(_book_update_bingo.format(tablename=self.tablename), (count, word))
+        self._database.execute(_book_update_bingo, (count, self._userId, self._bookId, word))
         self._database.commit()
 
+    def UpdateProgress(self, rows: Iterable[tuple[Any, ...]]):
+        '''
+        批量累加进度，rows 为 (wrong, right, bingo, due, interval, ease, reps, word)，
+        调度字段为 None 时保持原值。不提交事务，由调用者决定何时 commit。
+        '''
+        self._database.executemany(_book_update_progress, [(*row[:-1], self._userId, self._bookId, row[-1]) for row in rows])
+
     def QueryNewWords(self, count: int) -> list[Any]:
-        return self._database.query(_book_load_query.format(tablename=self.tablename), (count,))
+        return self._database.query(_book_load_query, (self._userId, self._bookId, count))
+
+    def QueryReviewWords(self, count: int, now: float | None = None) -> list[Any]:
+        if now is None:
+            now = time.time()
+        return self._database.query(_book_review_query, (self._userId, self._bookId, now, count))
+
+def LegacyTables(database: Database) -> list[tuple[str, str, str]]:
+    '''
+    列出旧版本的单词书表，返回 (tablename, user, sha1)。
+    '''
+    tables: list[tuple[str, str, str]] = []
+    for (name,) in database.query(_legacy_tables_query):
+        match = _legacy_tablename.match(name)
+        if match is not None:
+            tables.append((name, match.group(1), match.group(2)))
+    return tables
+
+def MigrateLegacyTable(database: Database, tablename: str, userId: int, bookId: int) -> int:
+    '''
+    把旧版本的单词书表并入 progress 表并删除旧表，返回迁移的单词数。
+    旧表不存在时返回 -1。整个迁移在一个事务里完成。
+    '''
+    legacy = Table(database, tablename)
+    if not legacy.IsExists():
+        return -1
+
+    columns = legacy.Columns()
+    # 早期的表还没有复习调度字段，背过的单词安排立即复习
+    fields = {
+        "due": "legacy.due" if "due" in columns else "CASE WHEN legacy.wrong > 0 OR legacy.right > 0 THEN ? END",
+        "interval": "legacy.interval" if "interval" in columns else "0",
+        "ease": "legacy.ease" if "ease" in columns else "2.5",
+        "reps": "legacy.reps" if "reps" in columns else "0",
+    }
+    params: tuple[Any, ...] = (userId, bookId) if "due" in columns else (userId, bookId, time.time())
+    try:
+        BookTable(database, userId, bookId).Create()
+        database.execute(_legacy_copy_words.format(tablename=tablename))
+        count = database.query(_legacy_count_query.format(tablename=tablename))[0][0]
+        database.execute(_legacy_copy_progress.format(tablename=tablename, **fields), params)
+        database.execute(_legacy_drop_table.format(tablename=tablename))
+        database.commit()
+    except Exception:
+        database.rollback()
+        raise
+
+    return count
 
-    def QueryReviewWords(self, count: int) -> list[Any]:
-        return self._database.query(_book_load_query.format(tablename=self.tablename), (count,))
+atexit.register(ConnectionManager.CloseAll)
@@ -0,0 +1,209 @@
+'''
+把 dict.db 编译成只读的紧凑索引文件（dict.idx），用 mmap 打开后二分查找，
+查询时不走 SQLite，也不用解析整个文件。
+
+文件格式（小端）：
+    header  : magic(4s) version(I) count(I) source_size(Q) source_mtime(Q) table_offset(Q)
+    heap    : 每个词条的 key 和 value，UTF-8 编码
+    table   : count 个 (prefix(Q), key_offset(Q), key_length(I), value_offset(Q), value_length(I))，按 key 排序
+
+key 是 Python str.lower() 的结果（和 Dictionary 查 SQLite 时的小写匹配一致，也转换非 ASCII 字母），
+prefix 是 key 的前 8 个字节按大端读出的整数（不足 8 个字节补 0），二分查找时先比较整数，前缀相同才比较整个 key。
+value 是用 \\x1f 分隔的 word、phonetic、translation、audio。
+
+    python -m core.dictindex build dict.db dict.idx
+    python -m core.dictindex bench dict.db dict.idx
+'''
+from __future__ import annotations
+import os
+import sys
+import mmap
+import time
+import random
+import struct
+import sqlite3
+import argparse
+from typing import Any
+
+_magic = b"WDIX"
+_version = 2
+_header = struct.Struct("<4sIIQQQ")
+_entry = struct.Struct("<QQIQI")
+_prefix = struct.Struct(">Q")
+_separator = "\x1f"
+
+# 按 key 排序，同一个 key 的多个写法里优先保留全小写的。
+# SQLite 的 lower() 只转换 ASCII，这里注册 Python 的 str.lower；TEXT 按 UTF-8 字节排序，和 bytes 的比较一致
+_build_query = """
+    SELECT pylower(word), word, phonetic, translation, audio
+    FROM stardict
+    ORDER BY pylower(word), word <> pylower(word), word
+"""
+
+def _keyPrefix(key: bytes) -> int:
+    return _prefix.unpack(key[:8].ljust(8, b"\0"))[0]
+
+def _source_stamp(source: str | os.PathLike) -> tuple[int, int]:
+    stat = os.stat(source)
+    return stat.st_size, int(stat.st_mtime)
+
+def Build(source: str | os.PathLike, output: str | os.PathLike) -> int:
+    '''
+    从 dict.db 生成索引文件，先写临时文件再替换，返回词条数。
+    '''
+    connection = sqlite3.connect(f"file:{os.path.abspath(source)}?mode=ro", uri=True)
+    connection.create_function("pylower", 1, str.lower, deterministic=True)
+    table = bytearray()
+    count = 0
+    tmpname = f"{output}.tmp"
+    try:
+        with open(tmpname, "wb") as f:
+            f.write(bytes(_header.size))
+            offset = _header.size
+            previous = None
+            for key, word, phonetic, translation, audio in connection.execute(_build_query):
+                keyBytes = key.encode()
+                if keyBytes == previous:
+                    continue
+                previous = keyBytes
+
+                value = _separator.join([word, phonetic or "", translation or "", audio or ""]).encode()
+                table += _entry.pack(_keyPrefix(keyBytes), offset, len(keyBytes), offset + len(keyBytes), len(value))
+                f.write(keyBytes)
+                f.write(value)
+                offset += len(keyBytes) + len(value)
+                count += 1
+
+            f.write(table)
+            f.seek(0)
+            f.write(_header.pack(_magic, _version, count, *_source_stamp(source), offset))
+
+        os.replace(tmpname, output)
+    finally:
+        connection.close()
+        if os.path.exists(tmpname):
+            os.remove(tmpname)
+
+    return count
+
+class DictIndex:
+    '''
+    mmap 打开的词典索引，Query 用二分查找，只在命中时解码一条 value。
+    '''
+    def __init__(self, pathname: str | os.PathLike, source: str | os.PathLike | None = None):
+        self._file = open(pathname, "rb")
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self._file.close()
+            raise
+
+        magic, version, count, size, mtime, tableOffset = _header.unpack_from(self._mm, 0)
+        if magic != _magic or version != _version:
+            self.Close()
+            raise ValueError(f"{pathname} is not a dictionary index")
+
+        # 词典更新过以后索引就过期了
+        if source is not None and os.path.exists(source) and _source_stamp(source) != (size, mtime):
+            self.Close()
+            raise ValueError(f"{pathname} is out of date, rebuild it from {source}")
+
+        self._count = count
+        self._tableOffset = tableOffset
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _compare(self, key: bytes, keyOffset: int, keyLength: int) -> int:
+        '''
+        前缀相同时比较整个 key，返回 -1、0、1（表中的 key 小于、等于、大于要找的 key）。
+        '''
+        if keyLength == len(key) and self._mm.find(key, keyOffset, keyOffset + keyLength) == keyOffset:
+            return 0
+        probe = self._mm[keyOffset:keyOffset + keyLength]
+        return -1 if probe < key else 1
+
+    def _find(self, key: bytes) -> int:
+        mm = self._mm
+        unpack = _entry.unpack_from
+        base = self._tableOffset
+        size = _entry.size
+        prefix = _keyPrefix(key)
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            probe, keyOffset, keyLength, _, _ = unpack(mm, base + mid * size)
+            if probe == prefix:
+                order = self._compare(key, keyOffset, keyLength)
+                if order == 0:
+                    return mid
+            else:
+                order = -1 if probe < prefix else 1
+            if order < 0:
+                lo = mid + 1
+            else:
+                hi = mid
+        return -1
+
+    def Query(self, word: str) -> dict[str, Any] | None:
+        index = self._find(word.lower().encode())
+        if index < 0:
+            return None
+
+        _, _, _, valueOffset, valueLength = _entry.unpack_from(self._mm, self._tableOffset + index * _entry.size)
+        word, phonetic, translation, audio = self._mm[valueOffset:valueOffset + valueLength].decode().split(_separator)
+        return {"word": word, "phonetic": phonetic, "translation": translation, "audio": audio or None}
+
+    def Close(self) -> None:
+        self._mm.close()
+        self._file.close()
+
+def Benchmark(source: str, pathname: str, samples: int = 2000) -> None:
+    '''
+    比较冷启动和单次查询的耗时：索引文件 vs stardict.StarDict.query。
+    '''
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "ECDICT")))
+    import stardict
+
+    connection = sqlite3.connect(f"file:{os.path.abspath(source)}?mode=ro", uri=True)
+    words = [row[0] for row in connection.execute("SELECT word FROM stardict ORDER BY random() LIMIT ?", (samples,))]
+    connection.close()
+    words += [f"{random.random()}" for _ in range(samples // 10)]  # 查不到的单词
+
+    start = time.perf_counter()
+    index = DictIndex(pathname, source)
+    index.Query(words[0])
+    indexOpen = time.perf_counter() - start
+    start = time.perf_counter()
+    for word in words:
+        index.Query(word)
+    indexQuery = (time.perf_counter() - start) / len(words)
+    index.Close()
+
+    start = time.perf_counter()
+    sd = stardict.StarDict(source)
+    sd.query(words[0])
+    stardictOpen = time.perf_counter() - start
+    start = time.perf_counter()
+    for word in words:
+        sd.query(word)
+    stardictQuery = (time.perf_counter() - start) / len(words)
+    sd.close()
+
+    print(f"{'':12s} {'open+first (ms)':>16s} {'per lookup (us)':>16s}")
+    print(f"{'dict.idx':12s} {indexOpen * 1000:16.3f} {indexQuery * 1000000:16.2f}")
+    print(f"{'StarDict':12s} {stardictOpen * 1000:16.3f} {stardictQuery * 1000000:16.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="compact dictionary index")
+    parser.add_argument("command", choices=["build", "bench"])
+    parser.add_argument("source", nargs="?", default="dict.db")
+    parser.add_argument("output", nargs="?", default="dict.idx")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        start = time.time()
+        count = Build(args.source, args.output)
+        print(f"{count} entries written to {args.output} in {time.time() - start:.1f}s")
+    else:
+        Benchmark(args.source, args.output)
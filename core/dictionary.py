@@ -0,0 +1,143 @@
+from __future__ import annotations
+import os
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Iterable
+from .dictindex import DictIndex
+
+# 界面上只用到音标、释义和发音文件，其他字段不再读取
+_dict_query_batch = """
+    SELECT word, phonetic, translation, audio FROM stardict WHERE word IN ({placeholders})
+"""
+
+class Dictionary:
+    '''
+    ECDICT 词典（dict.db）的只读查询，支持一次查询一批单词。
+
+    查过的词条（包括查不到的单词）保存在一个有容量上限的 LRU 缓存里，进程内共享，
+    重新进入单词书或者在场景之间切换时不会再访问磁盘。
+
+    如果有用 core.dictindex 编译好的索引文件，缓存未命中时优先查索引，没有索引或者索引过期时才查 SQLite。
+    '''
+    def __init__(self, dbname: str | os.PathLike = "dict.db", indexname: str | os.PathLike | None = None, capacity: int = 10000, chunkSize: int = 500):
+        self._dbname = dbname
+        self._indexname = indexname
+        self._index: DictIndex | None = None
+        self._indexChecked = False
+        self._capacity = capacity
+        self._chunkSize = chunkSize
+        self._connection: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+        self._cache: OrderedDict[str, dict[str, Any] | None] = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    @property
+    def hits(self) -> int:
+        return self._hits
+
+    @property
+    def misses(self) -> int:
+        return self._misses
+
+    def Stats(self) -> dict[str, int]:
+        with self._lock:
+            return {"hits": self._hits, "misses": self._misses, "size": len(self._cache), "capacity": self._capacity}
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            uri = f"file:{os.path.abspath(self._dbname)}?mode=ro"
+            self._connection = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        return self._connection
+
+    def _openIndex(self) -> DictIndex | None:
+        if not self._indexChecked:
+            self._indexChecked = True
+            if self._indexname is not None and os.path.exists(self._indexname):
+                try:
+                    self._index = DictIndex(self._indexname, self._dbname)
+                except Exception as e:
+                    logging.warning(f"{type(e)} - {e}")
+        return self._index
+
+    def _remember(self, word: str, record: dict[str, Any] | None) -> None:
+        self._cache[word] = record
+        self._cache.move_to_end(word)
+        while len(self._cache) > self._capacity:
+            self._cache.popitem(last=False)
+
+    def Query(self, word: str) -> dict[str, Any] | None:
+        return self.QueryBatch([word]).get(word)
+
+    def QueryBatch(self, words: Iterable[str]) -> dict[str, dict[str, Any]]:
+        '''
+        查询一批单词，返回 单词 -> 词条，查不到的单词不在结果里。
+        缓存里没有的单词分块用 IN (...) 查询；优先精确匹配，找不到时按小写匹配，
+        两种写法在同一次查询里一起查。
+        '''
+        words = list(dict.fromkeys(words))
+        results: dict[str, dict[str, Any]] = {}
+
+        with self._lock:
+            missing: list[str] = []
+            for word in words:
+                if word in self._cache:
+                    self._hits += 1
+                    self._cache.move_to_end(word)
+                    record = self._cache[word]
+                    if record is not None:
+                        results[word] = record
+                else:
+                    self._misses += 1
+                    missing.append(word)
+
+            if len(missing) == 0:
+                return results
+
+            index = self._openIndex()
+            if index is not None:
+                for word in missing:
+                    record = index.Query(word)
+                    self._remember(word, record)
+                    if record is not None:
+                        results[word] = record
+                return results
+
+            keys = list(dict.fromkeys(missing + [word.lower() for word in missing]))
+            exact: dict[str, dict[str, Any]] = {}
+            folded: dict[str, dict[str, Any]] = {}
+            cursor = self._connect().cursor()
+            for start in range(0, len(keys), self._chunkSize):
+                chunk = keys[start:start + self._chunkSize]
+                cursor.execute(_dict_query_batch.format(placeholders=",".join("?" * len(chunk))), chunk)
+                for word, phonetic, translation, audio in cursor.fetchall():
+                    record = {"word": word, "phonetic": phonetic or "", "translation": translation or "", "audio": audio}
+                    exact[word] = record
+                    folded.setdefault(word.lower(), record)
+
+            for word in missing:
+                record = exact.get(word) or folded.get(word.lower())
+                self._remember(word, record)
+                if record is not None:
+                    results[word] = record
+
+        return results
+
+    def Clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    def Close(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+            if self._index is not None:
+                self._index.Close()
+                self._index = None
+            self._indexChecked = False
+
+# 进程内共享的词典
+dictionary = Dictionary("dict.db", "dict.idx")
@@ -0,0 +1,210 @@
+'''
+把 ECDICT 的 ecdict.csv 导入成 dict.db（和 stardict.StarDict 使用的表结构一致）。
+
+CSV 按行切块，交给进程池解析，主进程按顺序每块一个事务写入，并在同一个事务里记录读到的文件位置，
+中断后再次运行会从上次提交的位置继续。除了 word 的唯一索引，其他索引在全部导入后再建。
+
+    python -m core.ecdict ECDICT/ecdict.csv dict.db
+'''
+from __future__ import annotations
+import os
+import re
+import sys
+import csv
+import time
+import sqlite3
+import argparse
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+
+_stardict_create_table = """
+CREATE TABLE IF NOT EXISTS "stardict" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL UNIQUE,
+    "word" VARCHAR(64) COLLATE NOCASE NOT NULL UNIQUE,
+    "sw" VARCHAR(64) COLLATE NOCASE NOT NULL,
+    "phonetic" VARCHAR(64),
+    "definition" TEXT,
+    "translation" TEXT,
+    "pos" VARCHAR(16),
+    "collins" INTEGER DEFAULT(0),
+    "oxford" INTEGER DEFAULT(0),
+    "tag" VARCHAR(64),
+    "bnc" INTEGER DEFAULT(NULL),
+    "frq" INTEGER DEFAULT(NULL),
+    "exchange" TEXT,
+    "detail" TEXT,
+    "audio" TEXT
+);
+"""
+
+_stardict_create_indexes = [
+    'CREATE UNIQUE INDEX IF NOT EXISTS "stardict_1" ON stardict (id);',
+    'CREATE UNIQUE INDEX IF NOT EXISTS "stardict_2" ON stardict (word);',
+    'CREATE INDEX IF NOT EXISTS "stardict_3" ON stardict (sw, word collate nocase);',
+    'CREATE INDEX IF NOT EXISTS "sd_1" ON stardict (word collate nocase);',
+]
+
+_stardict_insert = """
+    INSERT INTO stardict (word, sw, phonetic, definition, translation, pos, collins, oxford, tag, bnc, frq, exchange, detail, audio)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(word) DO NOTHING
+"""
+
+_checkpoint_create_table = """
+CREATE TABLE IF NOT EXISTS ecdict_import (
+    source TEXT PRIMARY KEY,
+    offset INTEGER NOT NULL,
+    rows INTEGER NOT NULL,
+    done INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+_checkpoint_query = """
+    SELECT offset, rows, done FROM ecdict_import WHERE source = ?
+"""
+
+_checkpoint_update = """
+    INSERT INTO ecdict_import (source, offset, rows, done) VALUES (?, ?, ?, ?)
+    ON CONFLICT(source) DO UPDATE SET offset = excluded.offset, rows = excluded.rows, done = excluded.done
+"""
+
+_columns = ["word", "phonetic", "definition", "translation", "pos", "collins", "oxford", "tag", "bnc", "frq", "exchange", "detail", "audio"]
+_escape = re.compile(r"\\(.)")
+_escapes = {"n": "\n", "r": "\r", "\\": "\\"}
+
+def _unescape(text: str) -> str:
+    return _escape.sub(lambda m: _escapes.get(m.group(1), m.group(0)), text)
+
+def _int(text: str, default: int | None) -> int | None:
+    try:
+        return int(text)
+    except ValueError:
+        return default
+
+def ParseLines(lines: list[bytes], header: bool = False) -> list[tuple]:
+    '''
+    解析一块 CSV 行，在子进程里运行。ECDICT 的字段里换行已经转义成 \\n，所以可以按行切块。
+    header 为 True 时（从文件开头读的那一块）跳过第一行的表头，单词 "word" 本身是正常的词条。
+    '''
+    rows: list[tuple] = []
+    if header:
+        lines = lines[1:]
+    for record in csv.reader(line.decode("utf-8") for line in lines):
+        if len(record) == 0 or record[0] == "":
+            continue
+
+        record = (record + [""] * len(_columns))[:len(_columns)]
+        word, phonetic, definition, translation, pos, collins, oxford, tag, bnc, frq, exchange, detail, audio = record
+        rows.append((
+            word,
+            "".join(ch for ch in word if ch.isalnum()).lower(),
+            phonetic,
+            _unescape(definition),
+            _unescape(translation),
+            pos,
+            _int(collins, 0),
+            _int(oxford, 0),
+            tag,
+            _int(bnc, None),
+            _int(frq, None),
+            exchange,
+            detail or None,
+            audio or None,
+        ))
+    return rows
+
+def _chunks(source: str, offset: int, chunkSize: int):
+    '''
+    从 offset 开始按行读取，每 chunkSize 行产生一块 (结束位置, 行列表)。
+    '''
+    with open(source, "rb") as f:
+        f.seek(offset)
+        lines: list[bytes] = []
+        for line in iter(f.readline, b""):
+            lines.append(line)
+            if len(lines) >= chunkSize:
+                yield f.tell(), lines
+                lines = []
+        if len(lines) > 0:
+            yield f.tell(), lines
+
+def Import(source: str, dbname: str, workers: int | None = None, chunkSize: int = 20000) -> int:
+    '''
+    导入 CSV，返回总共写入的行数（包括之前中断前写入的）。
+    '''
+    source = os.path.abspath(source)
+    connection = sqlite3.connect(dbname)
+    try:
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute(_stardict_create_table)
+        connection.execute(_checkpoint_create_table)
+        connection.commit()
+
+        # 用 fetchall 让语句执行完，未结束的读语句会让最后切换日志模式失败
+        checkpoint = connection.execute(_checkpoint_query, (source,)).fetchall()
+        offset, total, done = checkpoint[0] if len(checkpoint) > 0 else (0, 0, 0)
+        if done:
+            print(f"{source} already imported ({total} rows)")
+            return total
+        if offset > 0:
+            print(f"resuming {source} at byte {offset} ({total} rows)")
+
+        start = time.time()
+        imported = 0
+        workers = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(workers) as pool:
+            # 按提交顺序写入，保证检查点只会向前移动
+            pending: deque[tuple[int, Future]] = deque()
+
+            def commit(end: int, future: Future) -> None:
+                nonlocal total, imported
+                rows = future.result()
+                with connection:
+                    # 重复的单词会被忽略，按实际写入的行数计数
+                    changes = connection.total_changes
+                    connection.executemany(_stardict_insert, rows)
+                    inserted = connection.total_changes - changes
+                    connection.execute(_checkpoint_update, (source, end, total + inserted, 0))
+                total += inserted
+                imported += inserted
+                elapsed = max(time.time() - start, 1e-6)
+                print(f"\r{total} rows, {imported / elapsed:.0f} rows/s", end="", flush=True)
+
+            position = offset
+            for end, lines in _chunks(source, offset, chunkSize):
+                pending.append((end, pool.submit(ParseLines, lines, position == 0)))
+                position = end
+                if len(pending) >= workers * 2:
+                    commit(*pending.popleft())
+
+            while len(pending) > 0:
+                commit(*pending.popleft())
+
+        print()
+        print("building indexes ...")
+        for query in _stardict_create_indexes:
+            connection.execute(query)
+        with connection:
+            connection.execute(_checkpoint_update, (source, os.path.getsize(source), total, 1))
+
+        # 导入完成后切回默认的日志模式，只读打开时不需要 -wal/-shm 文件
+        connection.execute("PRAGMA journal_mode=DELETE").fetchall()
+        print(f"done, {total} rows in {time.time() - start:.1f}s")
+        return total
+    finally:
+        connection.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="import ECDICT csv into dict.db")
+    parser.add_argument("source", nargs="?", default=os.path.join("ECDICT", "ecdict.csv"))
+    parser.add_argument("output", nargs="?", default="dict.db")
+    parser.add_argument("--workers", type=int, default=None, help="parser processes, default cpu count")
+    parser.add_argument("--chunk", type=int, default=20000, help="rows per transaction")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.source):
+        print(f"{args.source} not found")
+        sys.exit(1)
+
+    Import(args.source, args.output, args.workers, args.chunk)
@@ -0,0 +1,160 @@
+from __future__ import annotations
+import atexit
+import logging
+import threading
+import time
+from . import database
+
+class ProgressJournal:
+    '''
+    单词进度的写后日志（write-behind）。
+
+    渲染线程只在内存里累加每个单词的增量，后台写线程把积攒的增量用一次
+    executemany 事务写回数据库。写入失败时增量会放回缓冲区，下次再写，不会丢失。
+    '''
+    _instances: dict[str, ProgressJournal] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, dbname: str, maxPending: int = 64, interval: float = 5.0):
+        self._dbname = dbname
+        self._maxPending = maxPending
+        self._interval = interval
+
+        # (userId, bookId, word) -> [wrong, right, bingo, schedule]
+        self._pending: dict[tuple[int, int, str], list] = {}
+        self._lock = threading.Lock()
+        self._done = threading.Condition(self._lock)
+        self._wakeup = threading.Event()
+        self._requested = 0 # 已请求的刷新序号
+        self._completed = 0 # 已完成的刷新序号
+        self._closed = False
+
+        self._thread = threading.Thread(target=self._run, name=f"ProgressJournal({dbname})", daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def Get(cls, dbname: str) -> ProgressJournal:
+        '''
+        获取数据库对应的日志，同一个数据库在进程内只有一个写线程。
+        '''
+        with cls._instances_lock:
+            journal = cls._instances.get(dbname)
+            if journal is None or journal._closed:
+                journal = cls(dbname)
+                cls._instances[dbname] = journal
+            return journal
+
+    @classmethod
+    def CloseAll(cls) -> None:
+        with cls._instances_lock:
+            journals = list(cls._instances.values())
+            cls._instances.clear()
+
+        for journal in journals:
+            journal.Close()
+
+    def Add(self, userId: int, bookId: int, word: str, wrong: int = 0, right: int = 0, bingo: int = 0,
+            schedule: tuple[float, float, float, int] | None = None) -> None:
+        '''
+        累加单词的计数，schedule 为 (due, interval, ease, reps)，后写入的覆盖先写入的。
+        '''
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("progress journal is closed")
+
+            delta = self._pending.setdefault((userId, bookId, word), [0, 0, 0, None])
+            delta[0] += wrong
+            delta[1] += right
+            delta[2] += bingo
+            if schedule is not None:
+                delta[3] = schedule
+            full = len(self._pending) >= self._maxPending
+
+        if full:
+            self._wakeup.set()
+
+    def Pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def Flush(self, wait: bool = True, timeout: float | None = None) -> bool:
+        '''
+        请求写线程立即写回，wait 为 True 时等待本次请求之前的增量全部落盘。
+        '''
+        with self._lock:
+            self._requested += 1
+            ticket = self._requested
+
+        self._wakeup.set()
+        if not wait:
+            return True
+
+        with self._lock:
+            return self._done.wait_for(lambda: self._completed >= ticket or not self._thread.is_alive(), timeout)
+
+    def Close(self) -> None:
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+
+        self._wakeup.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        db = database.Database(self._dbname)
+        try:
+            while True:
+                self._wakeup.wait(self._interval)
+                self._wakeup.clear()
+
+                with self._lock:
+                    closed = self._closed
+                    ticket = self._requested
+                    pending, self._pending = self._pending, {}
+
+                if len(pending) > 0 and not self._write(db, pending):
+                    # 写入失败，把增量合并回缓冲区，等待下次重试
+                    with self._lock:
+                        for key, delta in pending.items():
+                            merged = self._pending.setdefault(key, [0, 0, 0, None])
+                            for i in range(3):
+                                merged[i] += delta[i]
+                            if merged[3] is None:
+                                merged[3] = delta[3]
+
+                    if closed:
+                        logging.error(f"progress journal closed with {len(self._pending)} unsaved words")
+                        return
+
+                    time.sleep(min(self._interval, 1.0))
+                    continue
+
+                with self._lock:
+                    self._completed = max(self._completed, ticket)
+                    self._done.notify_all()
+
+                if closed:
+                    return
+        finally:
+            db.close()
+            with self._lock:
+                self._done.notify_all()
+
+    def _write(self, db: database.Database, pending: dict[tuple[int, int, str], list]) -> bool:
+        books: dict[tuple[int, int], list[tuple]] = {}
+        for (userId, bookId, word), (wrong, right, bingo, schedule) in pending.items():
+            books.setdefault((userId, bookId), []).append((wrong, right, bingo, *(schedule or (None,) * 4), word))
+
+        try:
+            for (userId, bookId), rows in books.items():
+                database.BookTable(db, userId, bookId).UpdateProgress(rows)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logging.error(f"{type(e)} - {e}")
+            return False
+
+        return True
+
+atexit.register(ProgressJournal.CloseAll)
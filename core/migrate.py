@@ -0,0 +1,71 @@
+'''
+把旧版本 users.db 里每个用户每本书一张的进度表，一次性迁移到统一的 progress 表。
+
+旧表名是 {user}_{sha1(单词书绝对路径)}，路径只能从哈希反查，所以需要给出单词书所在的目录，
+找不到对应文件的表会原样保留并列出来。
+
+    python -m core.migrate --db users.db --books books
+'''
+import os
+import sys
+import hashlib
+import argparse
+
+if __name__ == "__main__":
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core import database
+
+def FindBooks(roots: list[str]) -> dict[str, str]:
+    '''
+    遍历目录下的单词书，返回 sha1(绝对路径) -> 绝对路径。
+    '''
+    books: dict[str, str] = {}
+    for root in roots:
+        for dirpath, _, filenames in os.walk(root):
+            for filename in filenames:
+                if not filename.endswith(".txt"):
+                    continue
+
+                pathname = os.path.abspath(os.path.join(dirpath, filename))
+                books[hashlib.sha1(pathname.encode()).hexdigest()] = pathname
+    return books
+
+def Migrate(dbname: str, roots: list[str]) -> tuple[int, list[str]]:
+    '''
+    迁移所有能找到单词书的旧表，返回 (迁移的表数, 无法迁移的表名)。
+    '''
+    db = database.Database(dbname)
+    try:
+        users = database.UserTable(db)
+        users.Create()
+        library = database.LibraryTable(db)
+        library.Create()
+
+        books = FindBooks(roots)
+        migrated = 0
+        skipped: list[str] = []
+        for tablename, user, sha1 in database.LegacyTables(db):
+            pathname = books.get(sha1)
+            if pathname is None:
+                skipped.append(tablename)
+                continue
+
+            count = database.MigrateLegacyTable(db, tablename, users.QueryId(user), library.QueryId(pathname))
+            print(f"{tablename} -> {user} {pathname}: {count} words")
+            migrated += 1
+
+        return migrated, skipped
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="migrate per-book progress tables into the progress table")
+    parser.add_argument("--db", default="users.db", help="user database")
+    parser.add_argument("--books", action="append", help="directory containing the book files, can be repeated")
+    args = parser.parse_args()
+
+    migrated, skipped = Migrate(args.db, args.books or ["books"])
+    print(f"migrated {migrated} tables")
+    for tablename in skipped:
+        print(f"skipped {tablename}: book file not found")
@@ -0,0 +1,35 @@
+import time
+
+# SM-2 间隔重复算法的参数
+DEFAULT_EASE = 2.5
+MINIMUM_EASE = 1.3
+SECONDS_PER_DAY = 24 * 60 * 60
+
+def Quality(wrong: int) -> int:
+    '''
+    根据本轮拼错的次数给出回忆质量（0~5），拼错三次以上视为没有记住。
+    '''
+    return max(5 - wrong, 2)
+
+def Review(interval: float, ease: float, reps: int, quality: int, now: float | None = None) -> tuple[float, float, float, int]:
+    '''
+    按 SM-2 计算下一次复习的时间，返回 (due, interval, ease, reps)。
+    interval 以天为单位，due 为 unix 时间戳。
+    '''
+    if now is None:
+        now = time.time()
+
+    if quality < 3:
+        reps = 0
+        interval = 1
+    else:
+        if reps == 0:
+            interval = 1
+        elif reps == 1:
+            interval = 6
+        else:
+            interval = round(interval * ease)
+        reps += 1
+
+    ease = max(MINIMUM_EASE, ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    return now + interval * SECONDS_PER_DAY, interval, ease, reps
@@ -1,6 +1,9 @@
+import io
 import os
+import logging
 import pygame
 import utils
+from .audio import prefetcher
 
 class Word:
     def __init__(self, word: str, content: dict[str, str] | None):
@@ -9,14 +12,65 @@ class Word:
         self.right: int = 0
         self.bingo: int = 0
         self.content: dict[str, str] = content or {}
-        self.sound: pygame.mixer.Sound | None = None
-        ret, sound = utils.SimpleTTS().load(self.word)
-        if ret:
-            self.sound = pygame.mixer.Sound(sound)
-        
+        # 发音由 core.audio.prefetcher 在后台准备，这里只保存编码后的音频，
+        # 解码后的声音放在 utils.SoundCache 里，超过内存预算时会被淘汰，用到时再解码
+        self._data: bytes | None = None
+        self._loaded: bool = False
+        # 没准备好时要求播放的，准备好以后由预取线程播放
+        self._pending: bool = False
+
+    @property
+    def key(self) -> tuple[str, str]:
+        return ("word", self.word)
+
+    @property
+    def sound(self) -> pygame.mixer.Sound | None:
+        sound = utils.SoundCache.Get(self.key)
+        if sound is None and self._data is not None and pygame.mixer.get_init():
+            try:
+                sound = utils.SoundCache.Put(self.key, pygame.mixer.Sound(io.BytesIO(self._data)))
+            except Exception as e:
+                logging.error(f"{type(e)} - {e}")
+                self._data = None
+        return sound
+
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def ready(self) -> bool:
+        '''
+        发音已经加载并且解码好了（或者没有发音），play 不需要再做任何工作。
+        '''
+        return self._loaded and (self._data is None or self.key in utils.SoundCache)
+
+    def setSound(self, data: bytes | None, sound: pygame.mixer.Sound | None = None):
+        self._data = data
+        if sound is not None:
+            utils.SoundCache.Put(self.key, sound)
+        self._loaded = True
+        self.prepared()
+
+    def prepared(self):
+        '''
+        预取线程准备好发音以后调用，解码被淘汰的声音，有等待中的播放时播放。
+        '''
+        sound = self.sound
+        if self._pending:
+            self._pending = False
+            if sound is not None:
+                sound.play(loops=0)
+
     def play(self):
-        if self.sound is not None:
-            self.sound.play(loops=0)
+        if not self.ready():
+            # 还没准备好时不阻塞画面，优先准备这个单词，准备好以后马上播放
+            self._pending = True
+            prefetcher.Request(self)
+            return
+
+        self._pending = False
+        sound = self.sound
+        if sound is not None:
+            sound.play(loops=0)
 
     def __str__(self) -> str:
         return self.word
@@ -52,21 +106,21 @@ class Example(pygame.sprite.Group):
 
 class Letter(utils.Sprite):
     '''
-    单词拼写字母。
+    单词拼写字母，字形从字形图集里取，输入时不再渲染文字。
     '''
-    def __init__(self, char: str, x = 0, y = 0, font: pygame.font.Font | str = "Consolas"):
+    def __init__(self, char: str, x = 0, y = 0, font: pygame.font.Font | str = "Consolas", color = (0, 0, 0)):
         if type(font) is str:
             font = utils.FontManager.GetFont(font, 24)
-        elif type(font) is pygame.font.Font:
-            self.font = font
+        self.font = font
+        self.atlas = utils.FontManager.GetAtlas(font, color)
 
-        super().__init__(self.font.render(char, True, [0,0,0]), x, y)
+        super().__init__(self.atlas.Glyph(char), x, y)
         self.char = char
         self.type = char
         self.last = 0
         self.set('_')
         
-        self.__size = self.font.size(self.char)
+        self.__size = self.atlas.Size(self.char)
         self.rect = pygame.Rect(x, y, self.__size[0], self.__size[1])
     
     def size(self):
@@ -79,7 +133,7 @@ class Letter(utils.Sprite):
         val = ord(char)
         if val >= ord(' ') and val <= ord('~'):
             self.type = char
-            self.image = self.font.render(char, True, [0,0,0])
+            self.image = self.atlas.Glyph(char)
 
     def reset(self):
         self.set('_')
@@ -101,9 +155,11 @@ class CharSequence(pygame.sprite.Group):
         self.__height = 0
         self.__character_span = 2
         self.font = font
+        self.__atlas = utils.FontManager.GetAtlas(font, (0, 0, 0))
         for char in word:
-            self.__max_character_width = max(self.font.size(char)[0], self.__max_character_width)
-            self.__height = max(self.font.size(char)[1], self.__height)
+            width, height = self.__atlas.Size(char)
+            self.__max_character_width = max(width, self.__max_character_width)
+            self.__height = max(height, self.__height)
             
         self.__width  = self.__max_character_width * len(word) + (len(word) - 1) * self.__character_span
         self.x = x - self.__width // 2
@@ -122,6 +178,12 @@ class CharSequence(pygame.sprite.Group):
 
     def __str__(self) -> str:
         return self.__word
+
+    def draw(self, surface: pygame.Surface, *args, **kwargs) -> list[pygame.Rect]:
+        '''
+        整个单词从字形图集里用一次 Surface.blits 画出来。字母不要再加到别的 Group 里，否则会被那个 Group 逐个再画一遍。
+        '''
+        return self.__atlas.Blits(surface, [(letter.type, letter.rect) for letter in self.sequence])
     
     def press(self, char):
         if self.cursor < len(self.sequence) and ord(char) > ord(' ') and ord(char) < ord('~'):
@@ -1,6 +1,8 @@
+import os
 import pygame
 from scenes.login import LoginScene
 import utils
+from core import ConnectionManager, ProgressJournal
 from scenes import WelcomeScene, BooksScene, PrepareScene, RememberScene
 
 _screen_size = (1280, 1024)
@@ -9,6 +11,11 @@ if __name__ == "__main__":
     screen = pygame.display.set_mode(_screen_size)
     pygame.display.set_caption("兔哥背单词")
     
+    # 预先下载好的发音包，单词发音优先从这里读取
+    for pack in ("phonetic/en.pak", "phonetic/en.zip"):
+        if os.path.exists(pack):
+            utils.ResourceManager.add(pack)
+
     utils.SceneManager.AddScene("Welcome", WelcomeScene(_screen_size), True)
     utils.SceneManager.AddScene("Login", LoginScene(_screen_size, "login", theme_path="themes.json"))
     utils.SceneManager.AddScene("Books", BooksScene(_screen_size, "books"))
@@ -21,4 +28,6 @@ if __name__ == "__main__":
         
         clock.tick(60)
         
+    ProgressJournal.CloseAll()
+    ConnectionManager.CloseAll()
     pygame.quit()
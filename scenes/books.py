@@ -12,7 +12,11 @@ from core import Book
 class _Icons:
     def __init__(self, files: list[str] | None = None) -> None:
         if files is not None and len(files) > 0:
-            images = [pygame.image.load(s) for s in files if os.path.isfile(s)]
+            files = [s for s in files if os.path.isfile(s)]
+            images = [utils.ResourceManager.loadImage(s) for s in files]
+            missing = [s for s, i in zip(files, images) if i is None]
+            if len(missing) > 0:
+                raise pygame.error(f"cannot load icons: {', '.join(missing)}")
             w = max([i.get_width() for i in images])
             h = max([i.get_height() for i in images])
             
@@ -10,7 +10,7 @@ class GameScene(utils.Scene):
     def __init__(self, size: tuple[int, int], *args, **kwargs):
         super().__init__("Game", size, *args, **kwargs)
 
-        charactor = pygame.image.load("images/CH00171.png")
+        charactor = utils.ResourceManager.loadImage("images/CH00171.png")
         self.animates : list[utils.SpriteFrameAnim] = []
         self.scene: pygame.sprite.Group = pygame.sprite.Group()
 
@@ -13,7 +13,7 @@ import utils
 class LoginScene(utils.Scene):
     def __init__(self, size: tuple[int, int], *args, **kwargs):
         super().__init__("Login", size, 2, 1, *args, **kwargs)
-        self.background_image = pygame.image.load("images/background-4.png")
+        utils.ResourceManager.loadImageAsync("images/background-4.png", self._onBackgroundLoaded)
         self._panel = elements.UIPanel(
             relative_rect=pygame.Rect((0, 0), (400, 400)),
             manager=self._uimanager,
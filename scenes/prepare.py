@@ -24,7 +24,7 @@ class PrepareScene(utils.Scene):
         self._statusbar: pygame.sprite.Group = pygame.sprite.Group()
         self._font_color = (0,0,0)
         self._board_color = (0,0,0)
-        self.background_image = pygame.image.load("images/background-3.png")
+        utils.ResourceManager.loadImageAsync("images/background-3.png", self._onBackgroundLoaded)
 
     def _onEnter(self, prevScene: utils.Scene | None, *params, **kwargs) -> None:
         book = utils.SceneManager.GetSceneProperty("Books", "book")
@@ -33,7 +33,7 @@ class PrepareScene(utils.Scene):
             self.Next()
     
     def _onLeave(self, nextScene: utils.Scene | None) -> None:
-        pass
+        self._book.flush()
     
     def _onKeyDown(self, event: pygame.event.Event) -> None:
         if event.key == pygame.K_ESCAPE: 
@@ -10,9 +10,7 @@ if __name__ == "__main__":
 import pygame
 import utils
 from core import Book, Word, CharSequence
-import stardict
 
-dictionary = stardict.StarDict("dict.db")
 class RememberScene(utils.Scene):
     def __init__(self, size: tuple[int, int]):
         super().__init__("Remember", size, 5, 1)
@@ -36,9 +34,9 @@ class RememberScene(utils.Scene):
         self._border_color = (0,0,0)
         self._statusbar_color = (50, 50, 178)
 
-        self.background_image = pygame.image.load("images/background-3.png")
+        utils.ResourceManager.loadImageAsync("images/background-3.png", self._onBackgroundLoaded)
 
-        charactor = pygame.image.load("images/CH00171.png")
+        charactor = utils.ResourceManager.loadImage("images/CH00171.png")
         actions: dict[str, utils.SpriteFrameAnim] = {
             "left":      utils.SpriteFrameAnim(charactor.subsurface((0, 1024 // 8 * 0, 1024, 1024 // 8)), 1, 8, utils.SpriteFrameAnim.Mode.ROW, interval=0.125),
             "upleft":    utils.SpriteFrameAnim(charactor.subsurface((0, 1024 // 8 * 1, 1024, 1024 // 8)), 1, 8, utils.SpriteFrameAnim.Mode.ROW, interval=0.125),
@@ -65,7 +63,7 @@ class RememberScene(utils.Scene):
         self._charactor.move(0, 300)
 
     def _onLeave(self, nextScene: utils.Scene | None) -> None:
-        pass
+        self._book.flush()
     
     def _onKeyDown(self, event: pygame.event.Event) -> None:
         if self._currentSequence is None:
@@ -176,8 +174,8 @@ class RememberScene(utils.Scene):
                 for i, translation in enumerate(translations):
                     self._group.add(utils.Sprite(self._defaultFont.render(translation, True, self._font_color), 150, 230 + i * 40))
                     
+            # 拼写的字母由 Draw 单独画，不加到 _group 里
             self._currentSequence = CharSequence(self.__currentWord.word, self.width // 2, self.height - 100, self._charactorFont)
-            self._group.add(self._currentSequence)
 
             progress = f"progress: {self._book.index()}/{self._book.length()} | round: {self._book.round()}"
             progress_size = self._informationFont.size(progress)
@@ -249,6 +247,8 @@ class RememberScene(utils.Scene):
             )
         
         self._group.draw(surface)
+        if self._currentSequence is not None:
+            self._currentSequence.draw(surface)
         self._charactor.draw(surface)
         self._statusbar.draw(surface)
         self._fireworks.draw(surface)
@@ -10,7 +10,7 @@ class WelcomeScene(utils.Scene):
     def __init__(self, size):
         super().__init__("Welcome", size)
         self._application : pygame.sprite.Group = pygame.sprite.Group()
-        self.background_image = pygame.image.load("images/startup.png")
+        utils.ResourceManager.loadImageAsync("images/startup.png", self._onBackgroundLoaded)
         
         font = utils.FontManager.GetFont("font/msyh.ttc", 64)
         text = font.render("兔哥背单词", True, (255, 255, 255))
@@ -0,0 +1,115 @@
+'''
+用本地 http.server 模拟有道的发音接口，检查 Downloader 的下载、限流重试、退避放弃和中断后继续。
+
+    python -m pytest test/test_spider.py
+'''
+import os
+import sqlite3
+import threading
+import urllib.parse
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from utils.spider import DONE, FAILED, PENDING, Downloader, youdao
+
+class _Handler(BaseHTTPRequestHandler):
+    '''
+    flaky 前两次返回 500，limited 第一次返回 {"code": 403}，missing 总是 404，其他单词返回固定的数据。
+    '''
+    requests: Counter = Counter()
+    lock = threading.Lock()
+
+    def do_GET(self):
+        word = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)["audio"][0]
+        with self.lock:
+            self.requests[word] += 1
+            count = self.requests[word]
+
+        if word == "missing" or (word == "flaky" and count <= 2):
+            self.send_error(404 if word == "missing" else 500)
+            return
+
+        body = b'{"code": 403}' if word == "limited" and count == 1 else f"mp3:{word}".encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def server():
+    _Handler.requests = Counter()
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}/dictvoice"
+    httpd.shutdown()
+    httpd.server_close()
+
+@pytest.fixture
+def dictionary(tmp_path):
+    dbname = str(tmp_path / "dict.db")
+    connection = sqlite3.connect(dbname)
+    connection.execute("CREATE TABLE stardict (word TEXT, audio TEXT)")
+    connection.executemany("INSERT INTO stardict (word) VALUES (?)", [(w,) for w in ["apple", "banana", "flaky", "limited", "missing", "two words"]])
+    connection.commit()
+    connection.close()
+    return dbname
+
+def _downloader(tmp_path, dictionary, server) -> Downloader:
+    return Downloader(dictionary, str(tmp_path / "spider.db"), str(tmp_path / "en"), baseUrl=server, workers=4,
+                      rate=1000, burst=100, maxAttempts=3, backoff=0.01, maxBackoff=0.05, timeout=5, interval=0.1)
+
+def test_download_retry_and_give_up(tmp_path, dictionary, server):
+    downloader = _downloader(tmp_path, dictionary, server)
+    try:
+        # 不是纯字母的单词不下载
+        assert downloader.Seed() == 5
+        assert downloader.Run() == (4, 1)
+        assert downloader.Count(DONE) == 4
+        assert downloader.Count(FAILED) == 1
+        assert downloader.Count(PENDING) == 0
+    finally:
+        downloader.Close()
+
+    assert _Handler.requests["apple"] == 1
+    assert _Handler.requests["flaky"] == 3
+    assert _Handler.requests["limited"] == 2
+    assert _Handler.requests["missing"] == 3
+
+    path = youdao().path("flaky")
+    with open(tmp_path / "en" / path, "rb") as f:
+        assert f.read() == b"mp3:flaky"
+
+    connection = sqlite3.connect(dictionary)
+    audios = dict(connection.execute("SELECT word, audio FROM stardict").fetchall())
+    connection.close()
+    assert audios["flaky"] == path
+    assert audios["missing"] is None
+
+def test_resume_and_requeue(tmp_path, dictionary, server):
+    downloader = _downloader(tmp_path, dictionary, server)
+    try:
+        downloader.Seed()
+        downloader.Run()
+    finally:
+        downloader.Close()
+    requests = sum(_Handler.requests.values())
+
+    # 重新打开队列：已经完成和放弃的单词不会再请求
+    downloader = _downloader(tmp_path, dictionary, server)
+    try:
+        assert downloader.Seed() == 0
+        assert downloader.Run() == (0, 0)
+        assert sum(_Handler.requests.values()) == requests
+
+        # 文件损坏以后重新放进队列，只下载这一个
+        os.remove(tmp_path / "en" / youdao().path("apple"))
+        downloader.Enqueue(["apple"])
+        assert downloader.Run() == (1, 0)
+        assert _Handler.requests["apple"] == 2
+        assert sum(_Handler.requests.values()) == requests + 1
+    finally:
+        downloader.Close()
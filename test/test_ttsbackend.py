@@ -0,0 +1,67 @@
+'''
+用假的后端检查 BackendChain 的顺序：默认按给出的顺序，只有出错、超时或者探测失败的后端才排到后面。
+
+    python -m pytest test/test_ttsbackend.py
+'''
+import asyncio
+import pytest
+from utils.ttsbackend import Backend, BackendChain, NoBackendError
+
+class _Fake(Backend):
+    def __init__(self, name: str, delay: float, online: bool = True, fail: bool = False):
+        self.name = name
+        self.delay = delay
+        self.online = online
+        self.fail = fail
+        self.calls = 0
+
+    async def probe(self) -> bool:
+        return self.online
+
+    async def stream(self, text, voice, rate, volume):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError("offline")
+        yield self.name.encode()
+
+def _say(chain: BackendChain) -> str:
+    async def run():
+        backend, chunks = await chain.Open("word", "en-US-AriaNeural", "+0%", "+0%")
+        await chunks.aclose()
+        return backend.name
+    return asyncio.run(run())
+
+def test_slower_healthy_backend_keeps_first_place():
+    edge, local = _Fake("edge", 0.05), _Fake("local", 0.0)
+    chain = BackendChain([edge, local], timeout=1.0)
+
+    assert [_say(chain) for _ in range(5)] == ["edge"] * 5
+    assert local.calls == 0
+
+def test_failed_backend_moves_down_until_cooldown():
+    edge, local = _Fake("edge", 0.0, fail=True), _Fake("local", 0.0)
+    chain = BackendChain([edge, local], timeout=1.0, cooldown=0.05)
+
+    assert _say(chain) == "local"
+    assert [b.name for b in chain.Backends()] == ["local", "edge"]
+    assert _say(chain) == "local"
+    assert edge.calls == 1
+
+    edge.fail = False
+    asyncio.run(asyncio.sleep(0.06))
+    assert [b.name for b in chain.Backends()] == ["edge", "local"]
+    assert _say(chain) == "edge"
+
+def test_timeout_and_probe_failures():
+    edge, local = _Fake("edge", 0.2), _Fake("local", 0.0, online=False)
+    chain = BackendChain([edge, local], timeout=0.05)
+
+    with pytest.raises(NoBackendError):
+        _say(chain)
+    assert [b.name for b in chain.Backends()] == ["edge", "local"]
+
+    # 排到后面的后端在其他后端都失败时还会再试，成功以后恢复原来的位置
+    local.online = True
+    assert _say(chain) == "local"
+    assert [b.name for b in chain.Backends()] == ["local", "edge"]
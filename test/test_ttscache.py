@@ -0,0 +1,54 @@
+'''
+用不联网的 StubSynthesizer 检查 TTS 磁盘缓存：重复的单词只合成一次，命中率、访问时间批量写入和淘汰顺序。
+
+    python -m pytest test/test_ttscache.py
+'''
+import sqlite3
+from utils.ttscache import AudioCache, StubSynthesizer
+from utils.tts import SimpleTTS
+
+def test_repeated_workload_hits_cache(tmp_path):
+    cache = AudioCache(tmp_path / "tts")
+    stub = StubSynthesizer()
+    tts = SimpleTTS(cache=cache, synthesizer=stub)
+    words = [f"word{i}" for i in range(20)]
+
+    for _ in range(5):
+        for word in words:
+            ret, buf = tts.load(word)
+            assert ret and buf.getvalue() == AudioCache.Key(word, tts.voice, tts.rate, tts.volume).encode()
+
+    assert stub.calls == len(words)
+    stats = cache.Stats()
+    assert stats["hits"] == len(words) * 4
+    assert stats["hits"] / (stats["hits"] + stats["misses"]) >= 0.8
+    cache.Close()
+
+def test_access_times_are_batched(tmp_path):
+    cache = AudioCache(tmp_path / "tts", flushSize=4)
+    cache.Put("a", b"a")
+    before = cache._connect().execute("SELECT access FROM entries WHERE key = 'a'").fetchall()[0][0]
+
+    for _ in range(3):
+        assert cache.Get("a") == b"a"
+    # 只有一个 key，还没攒够一批，数据库里还是写入时的时间
+    assert cache._connect().execute("SELECT access FROM entries WHERE key = 'a'").fetchall()[0][0] == before
+
+    cache.Close()
+    connection = sqlite3.connect(tmp_path / "tts" / "index.db")
+    assert connection.execute("SELECT access FROM entries WHERE key = 'a'").fetchall()[0][0] > before
+    connection.close()
+
+def test_eviction_uses_pending_access_times(tmp_path):
+    cache = AudioCache(tmp_path / "tts", budget=30)
+    cache.Put("old", bytes(10))
+    cache.Put("new", bytes(10))
+    # 读过的 old 变成最近访问的，超过预算时先删 new
+    assert cache.Get("old") is not None
+    cache.Put("third", bytes(15))
+
+    assert cache.Get("new") is None
+    assert cache.Get("old") is not None
+    assert cache.Get("third") is not None
+    assert cache.Size() <= 30
+    cache.Close()
@@ -1,11 +1,15 @@
 from re import S
 import pygame
 from .tts import SimpleTTS
+from .ttscache import AudioCache
+from .cache import BudgetCache, SoundCache, SurfaceCache
+from .ttsbackend import BackendChain, EdgeBackend, LocalBackend, StubBackend
 from .scene import Scene, SceneManager
 from .fonts import FontManager
+from .glyphs import GlyphAtlas
 from .sprite import Sprite, SpriteFrameAnim
 from .spider import youdao
-from .resources import ResourceManager
+from .resources import ResourceManager, AssetHandle
 from .fireworks import Fireworks
 from .charactor import Charactor
 
@@ -16,6 +20,8 @@ def CenterPos(image: pygame.Surface, targetSize: tuple[int,int]) -> tuple[int,in
 FontManager = FontManager()
 SceneManager = SceneManager()
 ResourceManager = ResourceManager()
+# 异步加载的资源在每一帧开始时交付给主线程
+SceneManager.AddUpdater(ResourceManager.poll)
 
 SpriteFrameAnimMode = SpriteFrameAnim.Mode
 SpriteFrameAnimPlayMode = SpriteFrameAnim.PlayMode
@@ -23,7 +29,9 @@ __all__ = [
     "Scene",
     "SceneManager",
     "FontManager",
+    "GlyphAtlas",
     "ResourceManager",
+    "AssetHandle",
     "Sprite",
     "SpriteFrameAnim",
     "Charactor",
@@ -31,4 +39,12 @@ __all__ = [
     "youdao",
     "Fireworks",
     "SimpleTTS",
+    "AudioCache",
+    "BudgetCache",
+    "SoundCache",
+    "SurfaceCache",
+    "BackendChain",
+    "EdgeBackend",
+    "LocalBackend",
+    "StubBackend",
 ]
\ No newline at end of file
@@ -0,0 +1,237 @@
+'''
+只读的 zip 资源包。
+
+打开时不解析中央目录，而是读取旁边的索引文件（<name>.zip.idx，marshal 格式），索引按 zip 文件的大小和修改时间校验，
+过期或者不存在时才用 zipfile 解析一次并重新写入。zip 文件用 mmap 打开，按索引里的位置直接读本地文件头和数据，
+只支持不压缩和 deflate 两种方式，其他压缩方式交给 zipfile。read 从 mmap 上直接复制（或者解压）成员，不经过 zipfile 的文件对象。
+交给 pygame 解码的 open 返回 BytesIO：解码器按小块读取，Python 实现的文件对象每次读取的开销比复制一次整个成员还大。
+
+MountTrie 按路径的每一级保存挂载点，查找时沿着路径往下走，取最深的挂载点。
+
+    python -m utils.archive bench phonetic/en.zip
+'''
+from __future__ import annotations
+import io
+import os
+import mmap
+import time
+import random
+import argparse
+import tracemalloc
+import marshal
+import zlib
+import struct
+import logging
+import zipfile
+import tempfile
+import threading
+
+_version = 1
+_local_header = struct.Struct("<IHHHHHIIIHH")
+_local_signature = 0x04034B50
+
+def _stamp(path: str | os.PathLike) -> tuple[int, int]:
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+class Archive:
+    def __init__(self, path: str | os.PathLike, indexpath: str | os.PathLike | None = None):
+        self._path = os.path.abspath(path)
+        self._indexpath = indexpath or f"{self._path}.idx"
+        self._lock = threading.Lock()
+        self._zipfile: zipfile.ZipFile | None = None
+        # 成员名 -> (本地文件头位置, 压缩方式, 压缩后大小, 原始大小)
+        self._members: dict[str, tuple[int, int, int, int]] = self._loadIndex()
+        self._mm = MapFile(self._path)
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def _loadIndex(self) -> dict[str, tuple[int, int, int, int]]:
+        size, mtime = _stamp(self._path)
+        try:
+            with open(self._indexpath, "rb") as f:
+                index = marshal.loads(f.read())
+            if index["version"] == (_version, marshal.version) and index["size"] == size and index["mtime"] == mtime:
+                return index["members"]
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.warning(f"{type(e)} - {e}")
+
+        with zipfile.ZipFile(self._path) as zfile:
+            members = {
+                info.filename: (info.header_offset, info.compress_type, info.compress_size, info.file_size)
+                for info in zfile.infolist()
+                if not info.is_dir()
+            }
+
+        # 索引写不进去（比如只读目录）也不影响使用
+        try:
+            fd, tmpname = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self._indexpath)), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    marshal.dump({"version": (_version, marshal.version), "size": size, "mtime": mtime, "members": members}, f)
+                os.replace(tmpname, self._indexpath)
+            finally:
+                if os.path.exists(tmpname):
+                    os.remove(tmpname)
+        except Exception as e:
+            logging.warning(f"{type(e)} - {e}")
+
+        return members
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._members
+
+    def __len__(self) -> int:
+        return len(self._members)
+
+    def names(self) -> list[str]:
+        return list(self._members)
+
+    def info(self, name: str) -> tuple[int, int, int, int] | None:
+        return self._members.get(name)
+
+    def _dataOffset(self, offset: int) -> int:
+        '''
+        读本地文件头，返回数据开始的位置。
+        '''
+        fields = _local_header.unpack_from(self._mm, offset)
+        if fields[0] != _local_signature:
+            raise zipfile.BadZipFile(f"bad local file header at {offset} in {self._path}")
+        nameLength, extraLength = fields[9], fields[10]
+        return offset + _local_header.size + nameLength + extraLength
+
+    def view(self, name: str) -> memoryview | None:
+        '''
+        返回成员内容的 memoryview，给 read 用。不压缩的成员引用 mmap，在 Archive 关闭以后也会让 mmap 一直打开；
+        压缩的成员解压到新的 bytes。
+        '''
+        member = self._members.get(name)
+        if member is None:
+            return None
+
+        offset, method, compressSize, fileSize = member
+        if method not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            with self._lock:
+                if self._zipfile is None:
+                    self._zipfile = zipfile.ZipFile(self._path)
+                return memoryview(self._zipfile.read(name))
+
+        start = self._dataOffset(offset)
+        if start + compressSize > len(self._mm):
+            raise zipfile.BadZipFile(f"{name} in {self._path} is truncated")
+
+        data = memoryview(self._mm)[start:start + compressSize]
+        if method == zipfile.ZIP_DEFLATED:
+            data = memoryview(zlib.decompressobj(-zlib.MAX_WBITS).decompress(data))
+        if len(data) != fileSize:
+            raise zipfile.BadZipFile(f"{name} in {self._path} is truncated")
+        return data
+
+    def read(self, name: str) -> bytes | None:
+        data = self.view(name)
+        return bytes(data) if data is not None else None
+
+    def open(self, name: str) -> io.BytesIO | None:
+        data = self.read(name)
+        return io.BytesIO(data) if data is not None else None
+
+    def close(self) -> None:
+        # 还有 view 返回的 memoryview 在用时，mmap 会在它们释放后关闭
+        with self._lock:
+            self._mm = None
+            if self._zipfile is not None:
+                self._zipfile.close()
+                self._zipfile = None
+
+def MapFile(path: str | os.PathLike) -> mmap.mmap | bytes:
+    '''
+    只读 mmap 整个文件，文件句柄马上关闭，mmap 在没有引用以后释放。空文件不能 mmap，返回 b""。
+    '''
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+def _parts(path: str) -> list[str]:
+    return [part for part in path.replace("\\", "/").split("/") if part != ""]
+
+class MountTrie:
+    def __init__(self):
+        self._root: dict = {}
+
+    def add(self, root: str, archive: Archive) -> None:
+        node = self._root
+        for part in _parts(root):
+            node = node.setdefault(part, {})
+        node[None] = archive
+
+    def find(self, path: str) -> tuple[Archive | None, str | None]:
+        '''
+        返回 (最深的挂载点, 挂载点下的相对路径)，相对路径用 / 分隔。
+        '''
+        parts = _parts(path)
+        node = self._root
+        found: tuple[Archive | None, str | None] = (None, None)
+        for i, part in enumerate(parts):
+            node = node.get(part)
+            if node is None:
+                break
+            if None in node and i + 1 < len(parts):
+                found = (node[None], "/".join(parts[i + 1:]))
+        return found
+
+def Benchmark(path: str, samples: int = 2000) -> None:
+    '''
+    比较读取成员的耗时和分配的内存：zipfile + BytesIO（原来的做法）、Archive.open（mmap 上读取，再放进 BytesIO）。
+    '''
+    archive = Archive(path)
+    names = random.sample(archive.names(), min(samples, len(archive)))
+    stored = sum(1 for name in names if archive.info(name)[1] == zipfile.ZIP_STORED)
+    zfile = zipfile.ZipFile(path)
+
+    def consume(file) -> None:
+        # 模拟解码器：按 4K 分块读完整个文件
+        while file.read(4096):
+            pass
+
+    def zipRead(name: str) -> None:
+        with zfile.open(name) as file:
+            consume(io.BytesIO(file.read()))
+
+    def archiveOpen(name: str) -> None:
+        consume(archive.open(name))
+
+    print(f"{len(names)} members, {stored} stored, from {path}")
+    print(f"{'':16s} {'per member (us)':>16s} {'peak alloc (B)':>16s}")
+    for label, func in (("zipfile+BytesIO", zipRead), ("Archive.open", archiveOpen)):
+        start = time.perf_counter()
+        for name in names:
+            func(name)
+        elapsed = (time.perf_counter() - start) / len(names)
+
+        # 单独统计内存，tracemalloc 会拖慢计时
+        tracemalloc.start()
+        allocated = 0
+        for name in names:
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            func(name)
+            allocated += tracemalloc.get_traced_memory()[1] - current
+        tracemalloc.stop()
+        print(f"{label:16s} {elapsed * 1000000:16.2f} {allocated / len(names):16.0f}")
+
+    zfile.close()
+    archive.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="zip resource archive")
+    parser.add_argument("command", choices=["bench"])
+    parser.add_argument("path", nargs="?", default=os.path.join("phonetic", "en.zip"))
+    parser.add_argument("--samples", type=int, default=2000)
+    args = parser.parse_args()
+
+    Benchmark(args.path, args.samples)
@@ -0,0 +1,141 @@
+'''
+按字节预算淘汰的 LRU 缓存，用来保存解码后的声音这类占内存大、但随时可以重新生成的对象。
+'''
+from __future__ import annotations
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+import pygame
+
+def SoundSize(sound: pygame.mixer.Sound) -> int:
+    '''
+    解码后的 PCM 字节数：时长 * 采样率 * 声道数 * 每个采样的字节数。
+    '''
+    init = pygame.mixer.get_init()
+    if not init:
+        return 0
+    frequency, size, channels = init
+    return int(sound.get_length() * frequency) * channels * (abs(size) // 8)
+
+def SurfaceSize(surface: pygame.Surface) -> int:
+    return surface.get_pitch() * surface.get_height()
+
+class BudgetCache:
+    '''
+    总大小超过预算时淘汰最久没有用过的条目。Pin 过的条目不会被淘汰（引用计数，Pin 几次就要 Unpin 几次），
+    可以在条目放进缓存之前先 Pin。被淘汰的对象只是缓存不再引用，调用者手里的引用仍然有效。
+    '''
+    def __init__(self, budget: int, sizeof: Callable[[Any], int]):
+        self._budget = budget
+        self._sizeof = sizeof
+        self._lock = threading.Lock()
+        self._items: OrderedDict[Hashable, tuple[Any, int]] = OrderedDict()
+        self._pins: dict[Hashable, int] = {}
+        self._size = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    @property
+    def budget(self) -> int:
+        return self._budget
+
+    @budget.setter
+    def budget(self, value: int):
+        with self._lock:
+            self._budget = value
+            self._evict()
+
+    def Get(self, key: Hashable) -> Any | None:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self._misses += 1
+                return None
+
+            self._hits += 1
+            self._items.move_to_end(key)
+            return item[0]
+
+    def Put(self, key: Hashable, value: Any) -> Any:
+        size = self._sizeof(value)
+        with self._lock:
+            previous = self._items.pop(key, None)
+            if previous is not None:
+                self._size -= previous[1]
+            self._items[key] = (value, size)
+            self._size += size
+            self._evict()
+        return value
+
+    def Remove(self, key: Hashable) -> None:
+        with self._lock:
+            item = self._items.pop(key, None)
+            if item is not None:
+                self._size -= item[1]
+
+    def Pin(self, key: Hashable) -> None:
+        with self._lock:
+            self._pins[key] = self._pins.get(key, 0) + 1
+
+    def Unpin(self, key: Hashable) -> None:
+        with self._lock:
+            count = self._pins.get(key, 0) - 1
+            if count > 0:
+                self._pins[key] = count
+            else:
+                self._pins.pop(key, None)
+            self._evict()
+
+    def _evict(self) -> None:
+        if self._size <= self._budget:
+            return
+
+        for key in list(self._items):
+            if self._size <= self._budget:
+                break
+            if key in self._pins:
+                continue
+            _, size = self._items.pop(key)
+            self._size -= size
+            self._evictions += 1
+
+    def Clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._size = 0
+
+    def Size(self) -> int:
+        with self._lock:
+            return self._size
+
+    def Stats(self) -> dict[str, int]:
+        with self._lock:
+            pinned = sum(size for key, (_, size) in self._items.items() if key in self._pins)
+            return {
+                "size": self._size,
+                "budget": self._budget,
+                "count": len(self._items),
+                "pinned": pinned,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+            }
+
+    def Entries(self) -> list[tuple[Hashable, int, int]]:
+        '''
+        每个条目的 (key, 字节数, pin 次数)，按最久没用到最近用过排列。
+        '''
+        with self._lock:
+            return [(key, size, self._pins.get(key, 0)) for key, (_, size) in self._items.items()]
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._items
+
+# 进程内共享的解码声音缓存，单词发音和 ResourceManager.loadSound 都用它
+SoundCache = BudgetCache(64 * 1024 * 1024, SoundSize)
+# ResourceManager.loadImage 加载的图片
+SurfaceCache = BudgetCache(128 * 1024 * 1024, SurfaceSize)
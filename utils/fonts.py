@@ -1,8 +1,11 @@
 from __future__ import annotations
+import io
 import os
 import pygame
-import hashlib
 from typing import Hashable, Iterable
+from .glyphs import GlyphAtlas
+
+FontKey = tuple[str | tuple[str, ...], int, bool, bool]
 
 class FontManager:
     '''
@@ -15,55 +18,89 @@ class FontManager:
         return cls._instance
     
     def __init__(self) -> None:
-        self.fonts : dict[str, pygame.font.Font] = {}
+        self.fonts : dict[FontKey, pygame.font.Font] = {}
+        # 字体文件路径 -> 文件内容，同一个文件的所有字号和样式共用一份
+        self._files : dict[str, bytes] = {}
+        # (字体, 颜色) -> 字形图集
+        self._atlases : dict[tuple[pygame.font.Font, tuple[int, ...]], GlyphAtlas] = {}
+        self._hits = 0
+        self._misses = 0
     
-    def __FontSign(self, name: str | bytes | Iterable[str | bytes] | None, size: int, bold: Hashable, italic: Hashable) -> str:
+    def __FontName(self, name: str | bytes | Iterable[str | bytes] | None) -> str | tuple[str, ...]:
         '''
-        get font sign
+        normalize font name, font files are keyed by absolute path
         '''
         if name is None:
-            name = "Arial"
-        elif isinstance(name, bytes):
+            return "Arial"
+        if isinstance(name, bytes):
             name = name.decode()
-        elif isinstance(name, Iterable):
-            names: list[str] = []
-            for n in name:
-                if isinstance(n, bytes):
-                    names.append(n.decode())
-                elif isinstance(n, str):
-                    names.append(n)
-                    
-            name = ":".join(names)
-        
-        signString = f"{name}-{size}-{bold}-{italic}"
-        # md5sum signString
-        md5 = hashlib.md5()
-        md5.update(signString.encode())
-        return md5.hexdigest()
+        if isinstance(name, str):
+            return os.path.abspath(name) if os.path.isfile(name) else name
+        return tuple(n.decode() if isinstance(n, bytes) else n for n in name if isinstance(n, (str, bytes)))
+    
+    def __FontKey(self, name: str | bytes | Iterable[str | bytes] | None, size: int, bold: Hashable, italic: Hashable) -> FontKey:
+        '''
+        get font key
+        '''
+        return (self.__FontName(name), size, bool(bold), bool(italic))
+    
+    def __CreateFont(self, key: FontKey) -> pygame.font.Font:
+        name, size, bold, italic = key
+        if isinstance(name, str) and os.path.isabs(name):
+            data = self._files.get(name)
+            if data is None:
+                with open(name, "rb") as f:
+                    data = self._files[name] = f.read()
+            # 用 bytes 创建的 BytesIO 在写入之前和 bytes 共用同一块内存，不复制
+            font = pygame.font.Font(io.BytesIO(data), size)
+            font.set_bold(bold)
+            font.set_italic(italic)
+            return font
+        return pygame.font.SysFont(name, size, bold, italic)
     
     def GetFont(self, name: str | bytes | Iterable[str | bytes] | None, size: int, bold: Hashable = False, italic: Hashable = False) -> pygame.font.Font:
         '''
         get font
         '''
-        sign = self.__FontSign(name, size, bold, italic)
-        if type(name) is str:
-            filename = name
-            
-        if type(name) is bytes:
-            filename = name.decode()
-
-        if os.path.exists(filename):
-            self.fonts[sign] = pygame.font.Font(filename, size)
-            
-        if sign not in self.fonts:
-            self.fonts[sign] = pygame.font.SysFont(name, size, bold, italic)
-            
-        return self.fonts[sign]
+        key = self.__FontKey(name, size, bold, italic)
+        font = self.fonts.get(key)
+        if font is not None:
+            self._hits += 1
+            return font
+        
+        self._misses += 1
+        font = self.fonts[key] = self.__CreateFont(key)
+        return font
     
     def AddFont(self, name: str | bytes | Iterable[str | bytes] | None, size: int, bold: Hashable = False, italic: Hashable = False) -> None:
         '''
         add font
         '''
-        sign = self.__FontSign(name, size, bold, italic)
-        if sign not in self.fonts:
-            self.fonts[sign] = pygame.font.SysFont(name, size, bold, italic)
\ No newline at end of file
+        key = self.__FontKey(name, size, bold, italic)
+        if key not in self.fonts:
+            self.fonts[key] = self.__CreateFont(key)
+    
+    def GetAtlas(self, font: pygame.font.Font, color: Iterable[int]) -> GlyphAtlas:
+        '''
+        get glyph atlas of font in color, created on first use
+        '''
+        key = (font, tuple(color))
+        atlas = self._atlases.get(key)
+        if atlas is None:
+            atlas = self._atlases[key] = GlyphAtlas(font, key[1])
+        return atlas
+    
+    def Stats(self) -> dict[str, int | float]:
+        '''
+        cache statistics, "memory" is the bytes of font files kept in memory
+        '''
+        total = self._hits + self._misses
+        return {
+            "fonts": len(self.fonts),
+            "files": len(self._files),
+            "atlases": len(self._atlases),
+            "memory": sum(len(data) for data in self._files.values()),
+            "hits": self._hits,
+            "misses": self._misses,
+            "hitRate": self._hits / total if total > 0 else 0.0,
+        }
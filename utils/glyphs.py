@@ -0,0 +1,66 @@
+'''
+字形图集：把一个字体（字号）和颜色下的可打印 ASCII 字符一次画到同一张 Surface 上，记下每个字符的位置和大小。
+之后取字符只是查表拿 subsurface，整个单词可以用一次 Surface.blits 画出来，输入时不用再调用 font.render。
+'''
+from __future__ import annotations
+import pygame
+from typing import Iterable
+
+# 可打印 ASCII，' ' 到 '~'
+PRINTABLE = "".join(chr(code) for code in range(ord(" "), ord("~") + 1))
+
+class GlyphAtlas:
+    def __init__(self, font: pygame.font.Font, color: Iterable[int], antialias: bool = True):
+        self._font = font
+        self._color = tuple(color)
+        self._antialias = antialias
+        glyphs = [font.render(char, antialias, self._color) for char in PRINTABLE]
+        # 渲染出来的高度可能比 font.get_height() 大
+        self._height = max(glyph.get_height() for glyph in glyphs)
+        self._surface = pygame.Surface((sum(glyph.get_width() for glyph in glyphs), self._height), pygame.SRCALPHA)
+        # 字符 -> 在图集里的位置
+        self._rects: dict[str, pygame.Rect] = {}
+        x = 0
+        for char, glyph in zip(PRINTABLE, glyphs):
+            # 目标是全透明的，用加法混合原样复制，避免 alpha 混合把颜色压暗
+            self._surface.blit(glyph, (x, 0), special_flags=pygame.BLEND_RGBA_ADD)
+            self._rects[char] = pygame.Rect(x, 0, glyph.get_width(), glyph.get_height())
+            x += glyph.get_width()
+
+        self._glyphs: dict[str, pygame.Surface] = {char: self._surface.subsurface(rect) for char, rect in self._rects.items()}
+
+    @property
+    def surface(self) -> pygame.Surface:
+        return self._surface
+
+    @property
+    def height(self) -> int:
+        return self._height
+
+    def Glyph(self, char: str) -> pygame.Surface:
+        '''
+        字符的 Surface，不在图集里的字符（非 ASCII）第一次用到时单独渲染并保存。
+        '''
+        glyph = self._glyphs.get(char)
+        if glyph is None:
+            glyph = self._glyphs[char] = self._font.render(char, self._antialias, self._color)
+        return glyph
+
+    def Size(self, char: str) -> tuple[int, int]:
+        rect = self._rects.get(char)
+        if rect is not None:
+            return rect.size
+        return self.Glyph(char).get_size()
+
+    def Blits(self, target: pygame.Surface, items: Iterable[tuple[str, tuple[int, int] | pygame.Rect]]) -> list[pygame.Rect]:
+        '''
+        用一次 Surface.blits 画出 (字符, 位置) 列表，返回画过的区域。
+        '''
+        sequence = []
+        for char, position in items:
+            rect = self._rects.get(char)
+            if rect is not None:
+                sequence.append((self._surface, position, rect))
+            else:
+                sequence.append((self.Glyph(char), position))
+        return target.blits(sequence)
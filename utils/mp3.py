@@ -0,0 +1,137 @@
+'''
+MP3 帧头解析，只读帧头不解码，用来按帧切分音频流和估算时长。
+'''
+from __future__ import annotations
+from typing import Iterator, NamedTuple
+
+# (版本, 层) -> 比特率表（kbps），版本 1 是 MPEG1，2 是 MPEG2 和 MPEG2.5
+_bitrates = {
+    (1, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (1, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (1, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (2, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (2, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (2, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+
+# 帧头里的版本位 -> 采样率表
+_samplerates = {
+    3: (44100, 48000, 32000),  # MPEG1
+    2: (22050, 24000, 16000),  # MPEG2
+    0: (11025, 12000, 8000),   # MPEG2.5
+}
+
+class FrameHeader(NamedTuple):
+    version: int
+    layer: int
+    bitrate: int
+    samplerate: int
+    length: int
+    samples: int
+
+def ParseHeader(data: bytes | bytearray | memoryview, offset: int = 0) -> FrameHeader | None:
+    '''
+    解析 offset 处的帧头，不是合法帧头时返回 None。
+    '''
+    if offset + 4 > len(data):
+        return None
+
+    b0, b1, b2 = data[offset], data[offset + 1], data[offset + 2]
+    if b0 != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+
+    versionBits = (b1 >> 3) & 0x03
+    layerBits = (b1 >> 1) & 0x03
+    bitrateIndex = (b2 >> 4) & 0x0F
+    samplerateIndex = (b2 >> 2) & 0x03
+    padding = (b2 >> 1) & 0x01
+    if versionBits == 1 or layerBits == 0 or bitrateIndex in (0, 15) or samplerateIndex == 3:
+        return None
+
+    version = 1 if versionBits == 3 else 2
+    layer = 4 - layerBits
+    bitrate = _bitrates[(version, layer)][bitrateIndex] * 1000
+    samplerate = _samplerates[versionBits][samplerateIndex]
+
+    if layer == 1:
+        samples = 384
+        length = (12 * bitrate // samplerate + padding) * 4
+    else:
+        samples = 576 if layer == 3 and version == 2 else 1152
+        length = samples // 8 * bitrate // samplerate + padding
+
+    return FrameHeader(version, layer, bitrate, samplerate, length, samples)
+
+def SkipID3(data: bytes | bytearray | memoryview) -> int:
+    '''
+    返回 ID3v2 标签之后的位置，没有标签时返回 0。
+    '''
+    if len(data) < 10 or bytes(data[:3]) != b"ID3":
+        return 0
+
+    size = 0
+    for b in data[6:10]:
+        size = (size << 7) | (b & 0x7F)
+    footer = 10 if data[5] & 0x10 else 0
+    return 10 + size + footer
+
+def Frames(data: bytes | bytearray | memoryview, offset: int = 0) -> Iterator[tuple[int, FrameHeader]]:
+    '''
+    从 offset 开始依次产生完整的帧 (位置, 帧头)，遇到不是帧头的数据或者不完整的帧时停止。
+    '''
+    while True:
+        header = ParseHeader(data, offset)
+        if header is None or offset + header.length > len(data):
+            return
+        yield offset, header
+        offset += header.length
+
+def Split(data: bytes | bytearray | memoryview, offset: int = 0) -> tuple[int, int]:
+    '''
+    返回 (最后一个完整帧的结束位置, 完整帧数)，用来把流式数据切在帧边界上。
+    '''
+    end, count = offset, 0
+    for position, header in Frames(data, offset):
+        end = position + header.length
+        count += 1
+    return end, count
+
+def Duration(data: bytes | bytearray | memoryview) -> float:
+    '''
+    按帧头累加的时长（秒）。
+    '''
+    duration = 0.0
+    for _, header in Frames(data, SkipID3(data)):
+        duration += header.samples / header.samplerate
+    return duration
+
+def Validate(data: bytes | bytearray | memoryview, minDuration: float = 0.1, maxDuration: float = 60.0) -> tuple[bool, float, str | None]:
+    '''
+    检查是不是完整的 MP3：从头到尾都是连续的帧（允许开头的 ID3v2 和结尾的 ID3v1 标签），时长在合理范围内。
+    返回 (是否正常, 时长, 错误信息)。
+    '''
+    if len(data) == 0:
+        return False, 0.0, "empty file"
+    if bytes(data[:7]) == b'{"code"':
+        return False, 0.0, "error response"
+
+    start = SkipID3(data)
+    end, duration, count = start, 0.0, 0
+    for position, header in Frames(data, start):
+        end = position + header.length
+        duration += header.samples / header.samplerate
+        count += 1
+
+    if count == 0:
+        return False, 0.0, f"no mp3 frame at byte {start}"
+
+    trailing = len(data) - end
+    if trailing > 0 and not (trailing == 128 and bytes(data[end:end + 3]) == b"TAG"):
+        if ParseHeader(data, end) is not None:
+            return False, duration, f"truncated at byte {end}"
+        return False, duration, f"garbage at byte {end}"
+
+    if duration < minDuration or duration > maxDuration:
+        return False, duration, f"duration {duration:.2f}s out of range"
+
+    return True, duration, None
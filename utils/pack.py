@@ -0,0 +1,229 @@
+'''
+发音包（.pak）：把 phonetic/en 目录或者 en.zip 里的单词 MP3 打成一个文件，mmap 打开后二分查找。
+
+文件格式（小端）：
+    header : magic(4s) version(I) count(I) index_offset(Q)
+    data   : 每个单词的 MP3，依次存放
+    index  : count 个 (hash(Q), offset(Q), length(I))，按 hash 排序
+
+hash 是小写单词的 md5 的前 8 个字节（和 spider.youdao.path 用同一个 md5）。
+
+<name>.pak.bad 记录检查出损坏的条目的 hash（每行一个，十六进制，见 utils.scan），Query 会跳过这些条目，
+让 AudioResolver 去找重新下载到 phonetic/en 的文件。重新生成发音包时这个文件会被删除。
+
+    python -m utils.pack build phonetic/en phonetic/en.pak
+    python -m utils.pack build phonetic/en.zip phonetic/en.pak
+    python -m utils.pack bench phonetic/en.pak phonetic/en.zip
+'''
+from __future__ import annotations
+import os
+import time
+import mmap
+import random
+import struct
+import hashlib
+import zipfile
+import argparse
+from typing import Iterable, Iterator
+
+_magic = b"WPAK"
+_version = 1
+_header = struct.Struct("<4sIIQ")
+_entry = struct.Struct("<QQI")
+
+def WordHash(word: str) -> int:
+    return int.from_bytes(hashlib.md5(word.lower().encode("utf-8")).digest()[:8], "little")
+
+def _badPath(path: str | os.PathLike) -> str:
+    return f"{os.path.abspath(path)}.bad"
+
+def _loadBad(path: str | os.PathLike) -> set[int]:
+    try:
+        with open(_badPath(path), "r") as f:
+            return {int(line, 16) for line in f if line.strip() != ""}
+    except FileNotFoundError:
+        return set()
+
+def MarkBad(path: str | os.PathLike, hashes: Iterable[int]) -> int:
+    '''
+    把损坏的条目记进 <path>.bad，之后打开的发音包查询时跳过它们，返回记录的总数。
+    '''
+    bad = _loadBad(path) | set(hashes)
+    pathname = _badPath(path)
+    tmpname = f"{pathname}.tmp"
+    with open(tmpname, "w") as f:
+        f.writelines(f"{key:016x}\n" for key in sorted(bad))
+    os.replace(tmpname, pathname)
+    return len(bad)
+
+def _valid(data: bytes) -> bool:
+    # 有道返回的 {"code": 403} 不是音频
+    return len(data) > 0 and not data.startswith(b'{"code"')
+
+def _fromTree(root: str) -> Iterator[tuple[str, bytes]]:
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            if filename.endswith(".mp3"):
+                with open(os.path.join(dirpath, filename), "rb") as f:
+                    yield filename[:-4], f.read()
+
+def _fromZip(path: str) -> Iterator[tuple[str, bytes]]:
+    with zipfile.ZipFile(path) as zfile:
+        for info in zfile.infolist():
+            if not info.is_dir() and info.filename.endswith(".mp3"):
+                yield os.path.basename(info.filename)[:-4], zfile.read(info)
+
+def Build(source: str, output: str) -> int:
+    '''
+    从目录或者 zip 生成发音包，同一个单词只保留第一个，返回单词数。
+    '''
+    items = _fromZip(source) if zipfile.is_zipfile(source) else _fromTree(source)
+    entries: dict[int, tuple[int, int]] = {}
+    tmpname = f"{output}.tmp"
+    try:
+        with open(tmpname, "wb") as f:
+            f.write(bytes(_header.size))
+            offset = _header.size
+            for word, data in items:
+                key = WordHash(word)
+                if key in entries or not _valid(data):
+                    continue
+                f.write(data)
+                entries[key] = (offset, len(data))
+                offset += len(data)
+
+            for key in sorted(entries):
+                f.write(_entry.pack(key, *entries[key]))
+            f.seek(0)
+            f.write(_header.pack(_magic, _version, len(entries), offset))
+
+        os.replace(tmpname, output)
+        # 新的发音包里是重新收集的数据，旧的损坏记录不再适用
+        if os.path.exists(_badPath(output)):
+            os.remove(_badPath(output))
+    finally:
+        if os.path.exists(tmpname):
+            os.remove(tmpname)
+
+    return len(entries)
+
+class PronunciationPack:
+    def __init__(self, path: str | os.PathLike):
+        self._path = os.path.abspath(path)
+        with open(self._path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, count, indexOffset = _header.unpack_from(self._mm, 0)
+        if magic != _magic or version != _version:
+            self._mm.close()
+            raise ValueError(f"{path} is not a pronunciation pack")
+
+        self._count = count
+        self._indexOffset = indexOffset
+        self._bad = _loadBad(self._path)
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _find(self, key: int) -> int:
+        mm = self._mm
+        unpack = _entry.unpack_from
+        base = self._indexOffset
+        size = _entry.size
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            probe = unpack(mm, base + mid * size)[0]
+            if probe < key:
+                lo = mid + 1
+            elif probe > key:
+                hi = mid
+            else:
+                return mid
+        return -1
+
+    def __contains__(self, word: str) -> bool:
+        key = WordHash(word)
+        return key not in self._bad and self._find(key) >= 0
+
+    def Query(self, word: str) -> memoryview | None:
+        '''
+        返回单词 MP3 的 memoryview（直接引用 mmap，不复制），没有或者被标记为损坏时返回 None。
+        '''
+        key = WordHash(word)
+        index = self._find(key) if key not in self._bad else -1
+        if index < 0:
+            return None
+
+        _, offset, length = _entry.unpack_from(self._mm, self._indexOffset + index * _entry.size)
+        return memoryview(self._mm)[offset:offset + length]
+
+    def Entries(self, start: int = 0, end: int | None = None) -> Iterator[tuple[int, memoryview]]:
+        '''
+        按索引顺序产生 [start, end) 的 (hash, MP3 的 memoryview)，超出文件范围的条目返回空的 memoryview。
+        标记为损坏的条目也会产生，用来重新检查。
+        '''
+        end = self._count if end is None else min(end, self._count)
+        view = memoryview(self._mm)
+        for index in range(start, end):
+            key, offset, length = _entry.unpack_from(self._mm, self._indexOffset + index * _entry.size)
+            yield key, view[offset:offset + length] if offset + length <= len(self._mm) else view[0:0]
+
+    def Close(self) -> None:
+        # 还有 Query 返回的 memoryview 在用时，mmap 会在它们释放后关闭
+        self._mm = None
+
+def Benchmark(pack: str, source: str, samples: int = 2000) -> None:
+    '''
+    比较打开时间和单次查询的耗时：发音包 vs zip（zipfile）。
+    '''
+    start = time.perf_counter()
+    zfile = zipfile.ZipFile(source)
+    names = {os.path.basename(name)[:-4]: name for name in zfile.namelist() if name.endswith(".mp3")}
+    zipOpen = time.perf_counter() - start
+    words = random.sample(list(names), min(samples, len(names)))
+
+    start = time.perf_counter()
+    for word in words:
+        zfile.read(names[word])
+    zipQuery = (time.perf_counter() - start) / len(words)
+    zfile.close()
+
+    start = time.perf_counter()
+    p = PronunciationPack(pack)
+    packOpen = time.perf_counter() - start
+    start = time.perf_counter()
+    for word in words:
+        data = p.Query(word)
+        if data is not None:
+            bytes(data)
+    packQuery = (time.perf_counter() - start) / len(words)
+    p.Close()
+
+    print(f"{len(words)} words")
+    print(f"{'':10s} {'open (ms)':>12s} {'per lookup (us)':>16s}")
+    print(f"{'pack':10s} {packOpen * 1000:12.3f} {packQuery * 1000000:16.2f}")
+    print(f"{'zip':10s} {zipOpen * 1000:12.3f} {zipQuery * 1000000:16.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="pronunciation pack")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="build a pack from a directory or a zip")
+    build.add_argument("source", nargs="?", default=os.path.join("phonetic", "en"))
+    build.add_argument("output", nargs="?", default=os.path.join("phonetic", "en.pak"))
+    bench = subparsers.add_parser("bench", help="compare the pack with a zip")
+    bench.add_argument("pack", nargs="?", default=os.path.join("phonetic", "en.pak"))
+    bench.add_argument("source", nargs="?", default=os.path.join("phonetic", "en.zip"))
+    bench.add_argument("--samples", type=int, default=2000)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        start = time.time()
+        count = Build(args.source, args.output)
+        print(f"{count} words written to {args.output} in {time.time() - start:.1f}s")
+    else:
+        Benchmark(args.pack, args.source, args.samples)
@@ -2,12 +2,60 @@ from __future__ import annotations
 import os
 import io
 import sys
-import zipfile
 import logging
 import threading
 import queue
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable
 import pygame
 from .tts import SimpleTTS
+from .cache import SoundCache, SurfaceCache
+from .archive import Archive, MountTrie
+from .pack import PronunciationPack
+
+class AssetHandle:
+    '''
+    异步加载的句柄。读取、解压和解码在 ResourceManager 的线程池里完成，
+    结果在主线程调用 ResourceManager.poll（由 SceneManager.Update 调用）时交付，回调也在这时执行。
+    '''
+    def __init__(self, path: str | os.PathLike[str], future: Future):
+        self.path = path
+        self._future = future
+        self._done = False
+        self._result: Any = None
+        self._callbacks: list[Callable[[AssetHandle], None]] = []
+
+    def done(self) -> bool:
+        return self._done
+
+    def result(self) -> Any:
+        '''
+        交付之前返回 None，不会阻塞。
+        '''
+        return self._result
+
+    def wait(self, timeout: float | None = None) -> Any:
+        '''
+        阻塞等待加载完成并返回结果，回调仍然在下一次 poll 时执行。
+        '''
+        return self._future.result(timeout)
+
+    def then(self, callback: Callable[[AssetHandle], None]) -> AssetHandle:
+        if self._done:
+            callback(self)
+        else:
+            self._callbacks.append(callback)
+        return self
+
+    def _deliver(self) -> None:
+        self._result = self._future.result()
+        self._done = True
+        callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback(self)
+            except Exception as e:
+                logging.error(f"Error: {type(e)} - {e}")
 
 class ResourceManager:
     _instance = None
@@ -24,26 +72,37 @@ class ResourceManager:
         
         self._tts: SimpleTTS = SimpleTTS()
         self._loading: list[threading.Thread] = []
-        self._search_paths: list[tuple[str, zipfile.ZipFile]] = []
+        self._mounts: MountTrie = MountTrie()
+        self._packs: list[PronunciationPack] = []
+        # _mounts 和 _packs 在主线程、加载线程池和发音预取线程里都会用到
+        self._mountLock: threading.Lock = threading.Lock()
         self._search_queue: queue.Queue = queue.Queue(64)
+        self._executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="ResourceLoader")
+        self._pending: dict[tuple[str, str], AssetHandle] = {}
+        self._completed: queue.SimpleQueue = queue.SimpleQueue()
         self.__initlized = True
     
     def _async_init(self, path: str | os.PathLike) -> threading.Thread:
         def _loading():
             try:
-                zfile = zipfile.ZipFile(path)
+                if os.path.basename(path).endswith(".pak"):
+                    self._search_queue.put((None, PronunciationPack(path)))
+                    return
+
+                archive = Archive(path)
                 
-                # put absolute path and zip file object into search queue. 
-                # when call _get method, it will visit the search queue to find the zip file object.
-                self._search_queue.put((os.path.abspath(path)[:-4], zfile))
+                # put absolute path and archive object into search queue. 
+                # when call _get method, it will visit the search queue to find the archive object.
+                self._search_queue.put((os.path.abspath(path)[:-4], archive))
             except Exception as e:
                 return f"Error: {type(e)} - {e}"
 
         return threading.Thread(target=_loading)
         
     def add(self, path: str | os.PathLike) -> str | None:
+        # .zip 按目录挂载，.pak 是按单词查找的发音包
         basename = os.path.basename(path)
-        if not basename.endswith(".zip"):
+        if not basename.endswith(".zip") and not basename.endswith(".pak"):
             return "Invalid zip file"
             
         if not os.path.exists(path):
@@ -55,29 +114,24 @@ class ResourceManager:
     
     def _update(self):
         # get result from search queue
-        # after the loading thread is done, it will put the zip file object into search queue
-        # so we can get the zip file object from search queue
-        while not self._search_queue.empty():
-            root, zfile = self._search_queue.get()
-            self._search_paths.append((root, zfile))
+        # after the loading thread is done, it will put the archive object into search queue
+        # so we can get the archive object from search queue
+        with self._mountLock:
+            while not self._search_queue.empty():
+                root, archive = self._search_queue.get()
+                if root is None:
+                    self._packs.append(archive)
+                else:
+                    self._mounts.add(root, archive)
         
-    def _get(self, path: str | os.PathLike[str]) -> tuple[zipfile.ZipFile | None, str | None]:
+    def _get(self, path: str | os.PathLike[str]) -> tuple[Archive | None, str | None]:
         path = os.path.abspath(path)
         
         # check if the search paths are updated
         self._update()
-        # search in search paths
-        for root, zfile in self._search_paths:
-            if not path.startswith(root) or len(str(path)) <= len(root):
-                continue
-
-            subpath = path[len(root)+1:]
-            if sys.platform == "win32":
-                subpath = subpath.replace("\\", "/")
-
-            return zfile, subpath
-            
-        return None, None
+        # the deepest mount point on the path
+        with self._mountLock:
+            return self._mounts.find(path)
             
     def is_done(self) -> bool:
         self._update()
@@ -87,56 +141,160 @@ class ResourceManager:
                 return False
         return True
 
-    def loadSound(self, path: str | os.PathLike[str]) -> pygame.mixer.Sound | None:
+    def _open(self, path: str | os.PathLike[str]) -> io.BytesIO | None:
+        archive, subpath = self._get(path)
+        if archive is None or subpath is None:
+            return None
+        return archive.open(subpath)
+
+    def _key(self, kind: str, path: str | os.PathLike[str]) -> tuple[str, str]:
+        return (kind, os.path.abspath(path))
+
+    def loadSound(self, path: str | os.PathLike[str], pin: bool = False) -> pygame.mixer.Sound | None:
+        '''
+        解码过的声音放在共享的 SoundCache 里，pin 为 True 时固定在缓存里，直到 unpin。
+        '''
         try:
             if not pygame.mixer.get_init():
                 return None
-            
-            if os.path.exists(path):
-                return pygame.mixer.Sound(path)
-            
-            zfile, subpath = self._get(path)
-            if zfile is None or subpath is None:
-                return None
-            
-            with zfile.open(subpath) as file:
-                buffer = io.BytesIO(file.read())
-                return pygame.mixer.Sound(buffer)
+
+            key = self._key("sound", path)
+            sound = SoundCache.Get(key)
+            if sound is None:
+                if os.path.exists(path):
+                    sound = pygame.mixer.Sound(path)
+                else:
+                    file = self._open(path)
+                    if file is None:
+                        return None
+                    sound = pygame.mixer.Sound(file)
+                SoundCache.Put(key, sound)
+
+            # 加载成功以后才 pin，失败时不会留下永远不释放的 pin
+            if pin:
+                SoundCache.Pin(key)
+            return sound
         except Exception as e:
             logging.error(f"Error: {type(e)} - {e}")
             return None
         
-    def loadImage(self, path: str | os.PathLike[str]) -> pygame.Surface | None:
+    def loadImage(self, path: str | os.PathLike[str], pin: bool = False) -> pygame.Surface | None:
+        '''
+        加载过的图片放在 SurfaceCache 里，各个场景共用同一个 Surface，不要直接修改返回的 Surface。
+        pin 为 True 时固定在缓存里，直到 unpin。
+        '''
         try:
-            if os.path.exists(path):
-                return pygame.image.load(path)
-            
-            zfile, subpath = self._get(path)
-            if zfile is None:
+            key = self._key("image", path)
+            image = SurfaceCache.Get(key)
+            if image is None:
+                if os.path.exists(path):
+                    image = pygame.image.load(path)
+                else:
+                    file = self._open(path)
+                    if file is None:
+                        return None
+                    image = pygame.image.load(file, os.path.basename(path))
+                SurfaceCache.Put(key, image)
+
+            if pin:
+                SurfaceCache.Pin(key)
+            return image
+        except Exception as e:
+            logging.error(f"Error: {type(e)} - {e}")
+            return None
+
+    def unpin(self, path: str | os.PathLike[str]) -> None:
+        SoundCache.Unpin(self._key("sound", path))
+        SurfaceCache.Unpin(self._key("image", path))
+
+    def report(self) -> list[tuple[str, str, int, int]]:
+        '''
+        缓存里每个资源占用的内存，按从大到小排列：(类型, 路径, 字节数, pin 次数)。
+        '''
+        entries = [
+            (key[0], key[1], size, pins)
+            for cache in (SurfaceCache, SoundCache)
+            for key, size, pins in cache.Entries()
+            if isinstance(key, tuple) and key[0] in ("image", "sound")
+        ]
+        return sorted(entries, key=lambda entry: entry[2], reverse=True)
+
+    def loadArchived(self, path: str | os.PathLike[str]) -> bytes | None:
+        '''
+        只在挂载的 zip 里查找，不读取磁盘上的同名文件。
+        '''
+        try:
+            archive, subpath = self._get(path)
+            if archive is None or subpath is None:
                 return None
-            
-            with zfile.open(str(subpath)) as file:
-                buffer = io.BytesIO(file.read())
-                return pygame.image.load(buffer, str(subpath))
+
+            return archive.read(subpath)
         except Exception as e:
             logging.error(f"Error: {type(e)} - {e}")
             return None
 
+    def loadPronunciation(self, word: str) -> bytes | None:
+        '''
+        在挂载的发音包里查找单词的 MP3。复制成 bytes 返回，单词保存的发音不会引用发音包的 mmap。
+        '''
+        self._update()
+        with self._mountLock:
+            packs = list(self._packs)
+        for pack in packs:
+            data = pack.Query(word)
+            if data is not None:
+                return bytes(data)
+        return None
+
     def loadFile(self, path: str | os.PathLike[str]) -> io.BytesIO | None:
         try:
             if os.path.exists(path):
                 with open(path, "rb") as file:
                     return io.BytesIO(file.read())
             
-            zfile, subpath = self._get(path)
-            if zfile is None:
+            archive, subpath = self._get(path)
+            if archive is None or subpath is None:
                 return None
             
-            with zfile.open(str(subpath)) as file:
-                return io.BytesIO(file.read())
+            data = archive.read(subpath)
+            return io.BytesIO(data) if data is not None else None
         except Exception as e:
             logging.error(f"Error: {type(e)} - {e}")
             return None
+
+    def _submit(self, kind: str, load: Callable[[str | os.PathLike[str]], Any], path: str | os.PathLike[str]) -> AssetHandle:
+        # 同一个资源正在加载时返回同一个句柄
+        key = (kind, os.path.abspath(path))
+        handle = self._pending.get(key)
+        if handle is not None:
+            return handle
+
+        future = self._executor.submit(load, path)
+        handle = AssetHandle(path, future)
+        self._pending[key] = handle
+        future.add_done_callback(lambda _: self._completed.put(key))
+        return handle
+
+    def loadImageAsync(self, path: str | os.PathLike[str], callback: Callable[[AssetHandle], None] | None = None) -> AssetHandle:
+        handle = self._submit("image", self.loadImage, path)
+        return handle.then(callback) if callback is not None else handle
+
+    def poll(self) -> int:
+        '''
+        在主线程交付已经加载完成的资源，返回交付的个数。
+        '''
+        count = 0
+        while True:
+            try:
+                key = self._completed.get_nowait()
+            except queue.Empty:
+                break
+
+            handle = self._pending.pop(key, None)
+            if handle is not None:
+                handle._deliver()
+                count += 1
+        return count
         
 if __file__ == "__main__":
     resMgr = ResourceManager()
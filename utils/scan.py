@@ -0,0 +1,238 @@
+'''
+检查发音库（phonetic/en 目录或者 .pak 发音包）里的 MP3 是否完整：用进程池并行解析帧头，检查帧是否连续、时长是否合理。
+
+结果保存在 scan.db 里，按文件的修改时间和大小判断是否需要重新检查，再次运行只检查变化过的文件。
+加上 --repair 会删除损坏的文件，并把对应的单词放进 spider 的下载队列（spider.db），再运行 spider 就会重新下载。
+发音包里损坏的条目记进 <name>.pak.bad，查询时跳过，重新下载的文件会从 phonetic/en 读取；
+下载完以后可以用 python -m utils.pack build 重新生成发音包。
+
+    python -m utils.scan phonetic/en
+    python -m utils.scan phonetic/en --repair
+    python -m utils.scan phonetic/en.pak --repair --dict dict.db
+'''
+from __future__ import annotations
+import os
+import time
+import sqlite3
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator
+from . import mp3
+from .pack import MarkBad, PronunciationPack, WordHash
+from .spider import Downloader
+
+_index_create_table = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    mtime INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    ok INTEGER NOT NULL,
+    duration REAL NOT NULL,
+    error TEXT
+);
+"""
+
+_index_upsert = """
+    INSERT INTO files (path, mtime, size, ok, duration, error) VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT(path) DO UPDATE SET mtime = excluded.mtime, size = excluded.size, ok = excluded.ok,
+        duration = excluded.duration, error = excluded.error
+"""
+
+_index_select_prefix = """
+    SELECT path, mtime, size FROM files WHERE substr(path, 1, ?) = ?
+"""
+
+_index_select_bad = """
+    SELECT path, error FROM files WHERE ok = 0 AND substr(path, 1, ?) = ?
+"""
+
+def CheckFiles(files: list[tuple[str, int, int]]) -> list[tuple[str, int, int, int, float, str | None]]:
+    '''
+    在子进程里运行，检查一批 (路径, 修改时间, 大小)。
+    '''
+    results = []
+    for path, mtime, size in files:
+        try:
+            with open(path, "rb") as f:
+                ok, duration, error = mp3.Validate(f.read())
+        except OSError as e:
+            ok, duration, error = False, 0.0, f"{type(e)}-{e}"
+        results.append((path, mtime, size, int(ok), duration, error))
+    return results
+
+def CheckPack(path: str, start: int, end: int) -> list[tuple[int, float, str | None]]:
+    '''
+    在子进程里运行，检查发音包索引里 [start, end) 这些条目，只返回有问题的 (hash, 时长, 错误信息)。
+    '''
+    pack = PronunciationPack(path)
+    results = []
+    try:
+        for key, data in pack.Entries(start, end):
+            ok, duration, error = mp3.Validate(data)
+            if not ok:
+                results.append((key, duration, error))
+    finally:
+        pack.Close()
+    return results
+
+def _walk(root: str) -> Iterator[tuple[str, int, int]]:
+    with os.scandir(root) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from _walk(entry.path)
+            elif entry.name.endswith(".mp3"):
+                stat = entry.stat()
+                yield os.path.abspath(entry.path), stat.st_mtime_ns, stat.st_size
+
+class Scanner:
+    def __init__(self, indexname: str = "scan.db", workers: int | None = None, batchSize: int = 256):
+        self._workers = workers or os.cpu_count() or 1
+        self._batchSize = batchSize
+        self._index = sqlite3.connect(indexname)
+        self._index.execute("PRAGMA journal_mode=WAL")
+        self._index.execute(_index_create_table)
+        self._index.commit()
+
+    def Close(self) -> None:
+        self._index.close()
+
+    def ScanTree(self, root: str) -> tuple[int, int, list[tuple[str, str]]]:
+        '''
+        检查目录，返回 (检查的文件数, 没变化跳过的文件数, 损坏的 (路径, 错误信息))。
+        '''
+        prefix = os.path.join(os.path.abspath(root), "")
+        known = {
+            path: (mtime, size)
+            for path, mtime, size in self._index.execute(_index_select_prefix, (len(prefix), prefix))
+        }
+
+        checked = skipped = 0
+        batch: list[tuple[str, int, int]] = []
+        with ProcessPoolExecutor(self._workers) as pool:
+            futures = []
+            for path, mtime, size in _walk(root):
+                if known.pop(path, None) == (mtime, size):
+                    skipped += 1
+                    continue
+                batch.append((path, mtime, size))
+                if len(batch) >= self._batchSize:
+                    futures.append(pool.submit(CheckFiles, batch))
+                    batch = []
+            if len(batch) > 0:
+                futures.append(pool.submit(CheckFiles, batch))
+
+            for future in futures:
+                results = future.result()
+                checked += len(results)
+                with self._index:
+                    self._index.executemany(_index_upsert, results)
+                print(f"\r{checked} checked, {skipped} unchanged", end="", flush=True)
+        print()
+
+        # 已经不存在的文件
+        with self._index:
+            self._index.executemany("DELETE FROM files WHERE path = ?", [(path,) for path in known])
+
+        bad = self._index.execute(_index_select_bad, (len(prefix), prefix)).fetchall()
+        return checked, skipped, bad
+
+    def ScanPack(self, path: str) -> tuple[int, int, list[tuple[str, str]]]:
+        '''
+        检查发音包，包没有变化时直接返回上次的结果。损坏的条目记作 "<包路径>#<hash>"。
+        '''
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        prefix = f"{path}#"
+        rows = self._index.execute("SELECT mtime, size FROM files WHERE path = ?", (path,)).fetchall()
+        if len(rows) > 0 and rows[0] == (stat.st_mtime_ns, stat.st_size):
+            bad = self._index.execute(_index_select_bad, (len(prefix), prefix)).fetchall()
+            return 0, 1, bad
+
+        pack = PronunciationPack(path)
+        count = len(pack)
+        pack.Close()
+
+        results: list[tuple[int, float, str | None]] = []
+        step = max(self._batchSize * 16, 1)
+        with ProcessPoolExecutor(self._workers) as pool:
+            futures = [pool.submit(CheckPack, path, start, min(start + step, count)) for start in range(0, count, step)]
+            for future in futures:
+                results.extend(future.result())
+
+        with self._index:
+            self._index.execute("DELETE FROM files WHERE substr(path, 1, ?) = ?", (len(prefix), prefix))
+            self._index.executemany(_index_upsert, [(f"{prefix}{key:016x}", stat.st_mtime_ns, stat.st_size, 0, duration, error) for key, duration, error in results])
+            self._index.execute(_index_upsert, (path, stat.st_mtime_ns, stat.st_size, int(len(results) == 0), 0.0, None))
+
+        bad = [(f"{prefix}{key:016x}", error) for key, _, error in results]
+        return count, 0, bad
+
+def Repair(bad: list[tuple[str, str]], downloader: Downloader, dbname: str = "dict.db") -> int:
+    '''
+    删除损坏的文件，把对应的单词放进下载队列，返回放进队列的单词数。
+    发音包里的条目标记为损坏（见 pack.MarkBad），只有 hash，用词典里的单词反查，和 pack.Build 一样用 WordHash。
+    '''
+    words: list[str] = []
+    packs: dict[str, set[int]] = {}
+    for path, _ in bad:
+        if "#" in path:
+            pack, key = path.rsplit("#", 1)
+            packs.setdefault(pack, set()).add(int(key, 16))
+            continue
+        if os.path.exists(path):
+            os.remove(path)
+        words.append(os.path.basename(path)[:-4])
+
+    hashes: set[int] = set()
+    for pack, keys in packs.items():
+        MarkBad(pack, keys)
+        hashes |= keys
+
+    if len(hashes) > 0:
+        connection = sqlite3.connect(f"file:{os.path.abspath(dbname)}?mode=ro", uri=True)
+        try:
+            found: set[int] = set()
+            for word, in connection.execute("SELECT word FROM stardict"):
+                key = WordHash(word)
+                # 大小写不同的写法 hash 相同，只放一次
+                if key in hashes and key not in found:
+                    found.add(key)
+                    words.append(word)
+        finally:
+            connection.close()
+
+    downloader.Enqueue(words)
+    return len(words)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="check the pronunciation library for broken mp3 files")
+    parser.add_argument("source", nargs="?", default=os.path.join("phonetic", "en"), help="directory or .pak file")
+    parser.add_argument("--index", default="scan.db", help="scan results")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--repair", action="store_true", help="delete broken files and queue them for download")
+    parser.add_argument("--dict", default="dict.db", help="dictionary, used to find the words of broken pack entries")
+    parser.add_argument("--queue", default="spider.db", help="spider download queue")
+    args = parser.parse_args()
+
+    start = time.time()
+    scanner = Scanner(args.index, args.workers)
+    try:
+        if os.path.isdir(args.source):
+            checked, skipped, bad = scanner.ScanTree(args.source)
+        else:
+            checked, skipped, bad = scanner.ScanPack(args.source)
+    finally:
+        scanner.Close()
+
+    print(f"{checked} checked, {skipped} unchanged, {len(bad)} broken in {time.time() - start:.1f}s")
+    for path, error in bad[:20]:
+        print(f"  {path}: {error}")
+
+    if args.repair and len(bad) > 0:
+        downloader = Downloader(args.dict, args.queue)
+        try:
+            print(f"{Repair(bad, downloader, args.dict)} words queued, run: python -m utils.spider --no-seed")
+            if not os.path.isdir(args.source):
+                print(f"broken entries are skipped until the pack is rebuilt: python -m utils.pack build {os.path.join('phonetic', 'en')} {args.source}")
+        finally:
+            downloader.Close()
@@ -1,9 +1,12 @@
 from __future__ import annotations
 from abc import ABC, abstractmethod
-from typing import Any
+from typing import Any, Callable, TYPE_CHECKING
 import pygame
 import pygame_gui
 
+if TYPE_CHECKING:
+    from .resources import AssetHandle
+
 events = [
     pygame_gui.UI_BUTTON_PRESSED,
     pygame_gui.UI_BUTTON_START_PRESS,
@@ -62,6 +65,14 @@ class Scene(ABC):
     def background_image(self, image: pygame.Surface) -> None:
         self._background_image = pygame.transform.scale(image, self._size)
 
+    def _onBackgroundLoaded(self, handle: AssetHandle) -> None:
+        '''
+        ResourceManager.loadImageAsync 的回调，在主线程里缩放成背景，加载失败时保留原来的背景。
+        '''
+        image = handle.result()
+        if image is not None:
+            self.background_image = image
+
     @property
     def background_color(self) -> tuple[int,int,int]:
         return self._background_color
@@ -167,8 +178,22 @@ class SceneManager:
         if not hasattr(self, "currentScene"):
             self.currentScene : Scene | None = None
 
+        if not hasattr(self, "_updaters"):
+            self._updaters: list[Callable[[], Any]] = []
+
         self._properties: dict[str, Any] = {}
         self._tick = pygame.time.get_ticks()
+
+    def AddUpdater(self, updater: Callable[[], Any]) -> None:
+        '''
+        每次 Update 开始时在主线程调用，用来交付后台任务的结果。
+        '''
+        if updater not in self._updaters:
+            self._updaters.append(updater)
+
+    def RemoveUpdater(self, updater: Callable[[], Any]) -> None:
+        if updater in self._updaters:
+            self._updaters.remove(updater)
     
     def AddScene(self, name: str, scene: Scene, switch: bool = False) -> None:
         self.scenes[name] = scene
@@ -193,6 +218,9 @@ class SceneManager:
     def Update(self, *args, **kwargs) -> bool:
         if self.currentScene is None:
             return False
+
+        for updater in self._updaters:
+            updater()
         
         for event in pygame.event.get():
             if event.type in events:
@@ -2,16 +2,30 @@
 程序思想：
 有两个本地语音库，美音库Speech_US，英音库Speech_US
 调用有道api，获取语音MP3，存入对应的语音库中
+
+批量下载用 Downloader：线程池并发下载，令牌桶限速，失败按指数退避重试，
+待下载的单词保存在 spider.db 里，中断后再次运行会继续，dict.db 的 audio 字段按批更新。
+
+    python -m utils.spider --workers 8 --rate 5
+    python -m utils.spider --base-url http://127.0.0.1:8000/dictvoice   # 本地测试服务器
 '''
 
 import os
-import sqlite3
-import urllib.request
 import time
+import random
+import sqlite3
 import hashlib
+import argparse
+import tempfile
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+DEFAULT_BASE_URL = "http://dict.youdao.com/dictvoice"
 
 class youdao():
-    def __init__(self, type: int = 1):
+    def __init__(self, type: int = 1, baseUrl: str = DEFAULT_BASE_URL):
         '''
         调用youdao API
         type = 0：美音
@@ -21,6 +35,7 @@ class youdao():
         如果不存在，创建
         '''
         self._type = type  # 发音方式
+        self._baseUrl = baseUrl
 
         # 文件根目录
         # self._dirRoot = os.path.abspath(rootpath)
@@ -47,6 +62,13 @@ class youdao():
 
         # new save path
         return os.path.join(hex[:2], f"{word}.mp3")
+
+    def url(self, word) -> str:
+        '''
+        返回单词MP3的下载地址
+        '''
+        word = word.lower()
+        return f"{self._baseUrl}?type={self._type}&audio=" + word.replace(' ', '%20').replace('.', '')
         
     def down(self, word, saveto) -> str:
         '''
@@ -66,7 +88,7 @@ class youdao():
                 # 如果目录不存在，就创建
                 os.makedirs(os.path.dirname(saveto))
                 
-            urlpath = 'http://dict.youdao.com/dictvoice?type=' + str(self._type) + '&audio=' + word.replace(' ', '%20').replace('.', '')
+            urlpath = self.url(word)
             # 调用下载程序，下载到目标文件夹
             # print('不存在 %s.mp3 文件\n将URL:\n' % word, self._url, '\n下载到:\n', self._filePath)
             # 下载到目标地址
@@ -94,70 +116,280 @@ class youdao():
         # 返回声音文件路径
         return '\n'.join(messageTips)
 
+def IsInvalid(data: bytes) -> bool:
+    '''
+    有道限流时返回 {"code": 403}，不是音频。
+    '''
+    return len(data) == 0 or data.startswith(b'{"code"')
+
+class TokenBucket:
+    '''
+    令牌桶：平均每秒 rate 个请求，最多连续 burst 个。pause 让所有请求暂停一段时间（被限流时用）。
+    '''
+    def __init__(self, rate: float, burst: int):
+        self._rate = rate
+        self._burst = burst
+        self._tokens = float(burst)
+        self._last = time.monotonic()
+        self._pausedUntil = 0.0
+        self._lock = threading.Lock()
+
+    def pause(self, seconds: float) -> None:
+        with self._lock:
+            self._pausedUntil = max(self._pausedUntil, time.monotonic() + seconds)
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self._burst, self._tokens + (now - self._last) * self._rate)
+                self._last = now
+                if now >= self._pausedUntil and self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                delay = max(self._pausedUntil - now, (1 - self._tokens) / self._rate)
+            time.sleep(delay)
+
+_queue_create_table = """
+CREATE TABLE IF NOT EXISTS queue (
+    word TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    state INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_time REAL NOT NULL DEFAULT 0,
+    error TEXT
+);
+"""
+
+_queue_create_index = """
+CREATE INDEX IF NOT EXISTS queue_pending ON queue (state, next_time);
+"""
+
+_queue_insert = """
+    INSERT INTO queue (word, path) VALUES (?, ?) ON CONFLICT(word) DO NOTHING
+"""
+
+_queue_requeue = """
+    INSERT INTO queue (word, path) VALUES (?, ?)
+    ON CONFLICT(word) DO UPDATE SET path = excluded.path, state = 0, attempts = 0, next_time = 0, error = NULL
+"""
+
+_queue_select_pending = """
+    SELECT word, path, attempts FROM queue WHERE state = 0 AND next_time <= ? ORDER BY next_time LIMIT ?
+"""
+
+_queue_update = """
+    UPDATE queue SET state = ?, attempts = ?, next_time = ?, error = ? WHERE word = ?
+"""
+
+_dict_update_audio = """
+    UPDATE stardict SET audio = ? WHERE word = ?
+"""
+
+PENDING = 0
+DONE = 1
+FAILED = 2
+
+class Downloader:
+    '''
+    并发下载单词发音。
+
+    队列在 queuename（默认 spider.db）里，每个单词一行，记录状态、重试次数和下次可以重试的时间。
+    下载成功的单词按批用 executemany 写回 dict.db 的 audio 字段，同一批的队列状态在之后提交，
+    中途退出时最多重复检查一批，已经存在的文件不会再下载。
+    '''
+    def __init__(self, dbname: str = "dict.db", queuename: str = "spider.db", root: str = os.path.join("phonetic", "en"),
+                 type: int = 1, baseUrl: str = DEFAULT_BASE_URL, workers: int = 8, rate: float = 5.0, burst: int = 10,
+                 maxAttempts: int = 5, backoff: float = 2.0, maxBackoff: float = 300.0, timeout: float = 10.0,
+                 batchSize: int = 200, interval: float = 5.0):
+        self._dbname = dbname
+        self._queuename = queuename
+        self._root = root
+        self._youdao = youdao(type, baseUrl)
+        self._workers = workers
+        self._bucket = TokenBucket(rate, burst)
+        self._maxAttempts = maxAttempts
+        self._backoff = backoff
+        self._maxBackoff = maxBackoff
+        self._timeout = timeout
+        self._batchSize = batchSize
+        self._interval = interval
+
+        self._queue = sqlite3.connect(queuename)
+        self._queue.execute("PRAGMA journal_mode=WAL")
+        self._queue.execute(_queue_create_table)
+        self._queue.execute(_queue_create_index)
+        self._queue.commit()
+
+    def Close(self) -> None:
+        self._queue.close()
+
+    def Count(self, state: int) -> int:
+        return self._queue.execute("SELECT COUNT(*) FROM queue WHERE state = ?", (state,)).fetchall()[0][0]
+
+    def Seed(self, batchSize: int = 10000) -> int:
+        '''
+        把 dict.db 里还没有发音文件的单词加入队列，已经在队列里的不变，返回新加入的个数。
+        '''
+        connection = sqlite3.connect(self._dbname)
+        try:
+            before = self._queue.total_changes
+            rows: list[tuple[str, str]] = []
+            for word, audio in connection.execute("SELECT word, audio FROM stardict"):
+                if not word.isalpha():
+                    continue
+                if audio is not None and os.path.exists(os.path.join(self._root, audio)):
+                    continue
+
+                rows.append((word, self._youdao.path(word)))
+                if len(rows) >= batchSize:
+                    with self._queue:
+                        self._queue.executemany(_queue_insert, rows)
+                    rows = []
+
+            with self._queue:
+                self._queue.executemany(_queue_insert, rows)
+            return self._queue.total_changes - before
+        finally:
+            connection.close()
+
+    def Enqueue(self, words: list[str]) -> None:
+        '''
+        重新下载这些单词（比如检查出文件损坏），已经完成或者失败的也会重置。
+        '''
+        with self._queue:
+            self._queue.executemany(_queue_requeue, [(word, self._youdao.path(word)) for word in words])
+
+    def _download(self, word: str, path: str) -> tuple[bool, bool, str | None]:
+        '''
+        在线程池里运行，返回 (成功, 被限流, 错误信息)。
+        '''
+        saveto = os.path.join(self._root, path)
+        if os.path.exists(saveto):
+            with open(saveto, "rb") as f:
+                if not IsInvalid(f.read(16)):
+                    return True, False, None
+            os.remove(saveto)
+
+        self._bucket.acquire()
+        try:
+            with urllib.request.urlopen(self._youdao.url(word), timeout=self._timeout) as response:
+                data = response.read()
+        except urllib.error.HTTPError as e:
+            return False, e.code in (403, 429), f"HTTP {e.code}"
+        except Exception as e:
+            return False, False, f"{type(e)}-{e}"
+
+        if IsInvalid(data):
+            return False, True, data[:32].decode(errors="replace")
+
+        os.makedirs(os.path.dirname(saveto), exist_ok=True)
+        fd, tmpname = tempfile.mkstemp(dir=os.path.dirname(saveto), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmpname, saveto)
+        finally:
+            if os.path.exists(tmpname):
+                os.remove(tmpname)
+        return True, False, None
+
+    def _delay(self, attempts: int) -> float:
+        return min(self._backoff * (2 ** attempts), self._maxBackoff) * random.uniform(0.5, 1.0)
+
+    def Run(self) -> tuple[int, int]:
+        '''
+        处理队列直到没有可以下载的单词，返回这次 (下载成功数, 放弃数)。
+        '''
+        connection = sqlite3.connect(self._dbname)
+        audios: list[tuple[str, str]] = []
+        states: list[tuple[int, int, float, str | None, str]] = []
+        done = failed = 0
+        flushed = time.monotonic()
+        # 正在下载或者结果还没写回队列的单词，不能再从队列里取出来
+        claimed: set[str] = set()
+
+        def flush() -> None:
+            nonlocal flushed
+            # 先更新词典，再更新队列，中途退出时队列里的单词会被重新检查
+            with connection:
+                connection.executemany(_dict_update_audio, audios)
+            with self._queue:
+                self._queue.executemany(_queue_update, states)
+            claimed.difference_update(word for _, _, _, _, word in states)
+            audios.clear()
+            states.clear()
+            flushed = time.monotonic()
+            print(f"{done} downloaded, {failed} failed, {self.Count(PENDING)} pending", flush=True)
+
+        inflight: dict[Future, tuple[str, str, int]] = {}
+        try:
+            with ThreadPoolExecutor(self._workers, thread_name_prefix="Spider") as pool:
+                while True:
+                    if len(inflight) < self._workers * 2:
+                        limit = self._workers * 2 - len(inflight) + len(claimed)
+                        for word, path, attempts in self._queue.execute(_queue_select_pending, (time.time(), limit)).fetchall():
+                            if word not in claimed and len(inflight) < self._workers * 2:
+                                claimed.add(word)
+                                inflight[pool.submit(self._download, word, path)] = (word, path, attempts)
+
+                    if len(inflight) == 0:
+                        if len(states) > 0:
+                            flush()
+                        nextTime = self._queue.execute("SELECT MIN(next_time) FROM queue WHERE state = 0").fetchall()[0][0]
+                        if nextTime is None:
+                            break
+                        time.sleep(min(max(nextTime - time.time(), 0.1), self._maxBackoff))
+                        continue
+
+                    completed, _ = wait(inflight, timeout=1.0, return_when=FIRST_COMPLETED)
+                    for future in completed:
+                        word, path, attempts = inflight.pop(future)
+                        ok, limited, error = future.result()
+                        if ok:
+                            audios.append((path, word))
+                            states.append((DONE, attempts, 0, None, word))
+                            done += 1
+                            continue
+
+                        attempts += 1
+                        if limited:
+                            self._bucket.pause(self._delay(attempts))
+                        if attempts >= self._maxAttempts:
+                            states.append((FAILED, attempts, 0, error, word))
+                            failed += 1
+                        else:
+                            states.append((PENDING, attempts, time.time() + self._delay(attempts), error, word))
+
+                    if len(states) >= self._batchSize or (len(states) > 0 and time.monotonic() - flushed > self._interval):
+                        flush()
+        finally:
+            # 被打断时已经拿到的结果也写进去
+            if len(states) > 0:
+                flush()
+            connection.close()
+
+        return done, failed
+
 if __name__ == "__main__":
-    sp = youdao()
-    connection = sqlite3.connect('dict.db')
-    cursor = connection.cursor()
-    
-    dict_select_audio = """
-        SELECT word, audio FROM stardict
-    """
-    
-    dict_update_audio = """
-        UPDATE stardict SET audio = ? WHERE word = ?
-    """
-    
-    cursor.execute(dict_select_audio)
-    old = time.time()
-    word_count = 0
-    save_count = 0
-    skip_count = 0
-    
-    rows = cursor.fetchall()
-    total = len(rows)
-    for row in rows:
-        word = row[0]
-        word_count += 1
-        if word.isalpha() == False:
-            skip_count += 1
-            print(f"{word_count}/{len(rows)} 跳过 {word}, 不是单词, 已跳过 {skip_count}")
-            continue
-        
-        # if os.path.exists(path_old) and path_old != path_new:
-        #     if os.path.exists(os.path.dirname(path_new)) == False:
-        #         os.makedirs(os.path.dirname(path_new))
-            
-        #     # 如果存在旧文件，就移动到新文件夹
-        #     os.rename(path_old, path_new)
-        #     # 删除空文件夹
-        #     dir_old = os.path.dirname(path_old)
-        #     while os.path.exists(dir_old) and len(os.listdir(dir_old)) == 0:
-        #         os.rmdir(dir_old)
-        #         dir_old = os.path.dirname(dir_old)
-                
-        #     cursor.execute(dict_update_audio, (os.path.join(hex[:2], f"{word}.mp3"), word))
-        #     print(f"{word_count:6d}/{total:6d} 移动文件 {path_old} ==> {path_new}")
-        
-        
-        path_rel = sp.path(word)
-        path_new = os.path.join(os.path.abspath('.'), 'phonetic', 'en', path_rel)
-        
-        if row[1] is None or not os.path.exists(os.path.join(os.path.abspath('.'), 'phonetic', 'en', row[1])):
-            tips = sp.down(word, path_new)
-            cursor.execute(dict_update_audio, (path_rel, word))
-            save_count += 1
-        
-            print(f"{word_count:6d}/{total:6d} {tips}")
-
-        if time.time() - old > 60 and save_count > 0:
-            connection.commit()
-            save_count = 0
-            print(f"等待 5 秒 ..., 已经下载 {word_count}/{len(rows)} 个单词")
-            time.sleep(10)
-            old = time.time()
-        
-    connection.commit()
-    connection.close()
-    
+    parser = argparse.ArgumentParser(description="download youdao pronunciations into phonetic/en")
+    parser.add_argument("--db", default="dict.db", help="dictionary database")
+    parser.add_argument("--queue", default="spider.db", help="persistent work queue")
+    parser.add_argument("--root", default=os.path.join("phonetic", "en"))
+    parser.add_argument("--type", type=int, default=1, help="0: us, 1: uk")
+    parser.add_argument("--base-url", default=DEFAULT_BASE_URL)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=5.0, help="requests per second")
+    parser.add_argument("--burst", type=int, default=10)
+    parser.add_argument("--no-seed", action="store_true", help="only process the existing queue")
+    args = parser.parse_args()
 
-    
+    downloader = Downloader(args.db, args.queue, args.root, args.type, args.base_url, args.workers, args.rate, args.burst)
+    try:
+        if not args.no_seed:
+            print(f"{downloader.Seed()} words queued")
+        start = time.time()
+        done, failed = downloader.Run()
+        print(f"{done} downloaded, {failed} failed in {time.time() - start:.0f}s")
+    finally:
+        downloader.Close()
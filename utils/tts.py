@@ -1,14 +1,100 @@
 import io
+import time
 import asyncio
-from typing import Any, Coroutine
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, AsyncIterator, Callable, Coroutine, Iterable
 import pygame
-from edge_tts import Communicate
+from . import mp3
+from . import ttscache
+from . import ttsbackend
+from .ttscache import AudioCache
+from .ttsbackend import BackendChain, NoBackendError
+
+# 流式播放结束时发出的事件，属性 text 和 firstSound（开始到第一段出声的秒数，失败时为 None）
+SAY_FINISHED = pygame.event.custom_type()
+
+def _notify(text: str, firstSound: float | None) -> None:
+    try:
+        pygame.event.post(pygame.event.Event(SAY_FINISHED, text=text, firstSound=firstSound))
+    except pygame.error:
+        pass
+
+def _reservedChannel() -> pygame.mixer.Channel:
+    # 流式播放固定用第 0 个通道，Sound.play 自动选通道时不会占用它，也就不会因为没有空闲通道丢掉片段
+    pygame.mixer.set_reserved(1)
+    return pygame.mixer.Channel(0)
+
+class _StreamPlayer:
+    '''
+    把解码好的片段依次排到保留的混音通道上，Channel.queue 只能排一个，其余的先放在这里。
+
+    MP3 的帧会引用前面几帧的数据（bit reservoir），解码器的滤波器也要接着上一帧的输出，单独解码一段会在接缝处出现杂音。
+    所以每一段都带上前一段最后 primeFrames 帧一起解码，再把这几帧对应的 PCM 去掉。
+    '''
+    # 低码率时 bit reservoir 最多可以往前引用 511 字节，edge-tts 的 48kbps/24kHz 一帧 144 字节
+    primeFrames = 4
+
+    def __init__(self, start: float):
+        self._start = start
+        # 保留之前通道上可能还在播放的声音（上一次流式播放，或者保留之前自动选到这个通道的声音）让给新的播放
+        self._channel = _reservedChannel()
+        self._channel.stop()
+        self._segments: deque[pygame.mixer.Sound] = deque()
+        self._primer = b""
+        self.firstSound: float | None = None
+
+    def _decode(self, data: bytes) -> pygame.mixer.Sound:
+        buffer = self._primer + data
+        sound = pygame.mixer.Sound(io.BytesIO(buffer))
+        if len(self._primer) > 0:
+            # 解码器会跳过缺少 reservoir 数据的帧，所以按单独解码前几帧得到的长度去掉，而不是按帧数计算
+            cut = len(pygame.mixer.Sound(io.BytesIO(self._primer)).get_raw())
+            sound = pygame.mixer.Sound(buffer=sound.get_raw()[cut:])
+
+        frames = list(mp3.Frames(buffer, mp3.SkipID3(buffer)))[-self.primeFrames:]
+        if len(frames) > 0:
+            self._primer = buffer[frames[0][0]:frames[-1][0] + frames[-1][1].length]
+        return sound
+
+    def feed(self, data: bytes) -> None:
+        self._segments.append(self._decode(data))
+        self.pump()
+
+    def pump(self) -> None:
+        if len(self._segments) == 0:
+            return
+        if not self._channel.get_busy():
+            self._channel.play(self._segments.popleft())
+            if self.firstSound is None:
+                self.firstSound = time.perf_counter() - self._start
+        if len(self._segments) > 0 and self._channel.get_queue() is None:
+            self._channel.queue(self._segments.popleft())
+
+    def busy(self) -> bool:
+        return len(self._segments) > 0 or self._channel.get_busy()
 
 class SimpleTTS:
-    def __init__(self, voice: str = "zh-CN-YunxiNeural", rate: str = "+0%", volume: str = "+0%"):
+    '''
+    合成结果默认保存在 ttscache.cache 里，同样的文字和参数不会再合成第二次；cache 传 None 关闭缓存。
+    backends 是合成用的后端链，默认先用 edge-tts，失败或者超时时换成本地引擎，见 ttsbackend。
+    synthesizer 可以替换后端链，参数是 (text, voice, rate, volume)，返回音频字节。
+    '''
+    # 流式播放时第一段和之后每段至少包含的 MP3 帧数（edge-tts 默认 24kHz，一帧 24ms）
+    firstFrames = 8
+    segmentFrames = 32
+
+    def __init__(self, voice: str = "zh-CN-YunxiNeural", rate: str = "+0%", volume: str = "+0%",
+                 cache: AudioCache | None = ttscache.cache, synthesizer: Callable[[str, str, str, str], bytes] | None = None,
+                 backends: BackendChain = ttsbackend.backends):
         self.voice = voice
         self.rate = rate
         self.volume = volume
+        self._cache = cache
+        self._synthesizer = synthesizer
+        self._backends = backends
 
     @property
     def voice(self):
@@ -34,26 +120,121 @@ class SimpleTTS:
     def volume(self, value: str):
         self._volume = value
 
+    def _key(self, text: str, backend: str, format: str) -> str:
+        return AudioCache.Key(text, self.voice, self.rate, self.volume, backend, format)
+
+    def _keys(self, text: str) -> list[str]:
+        # 替换了合成器时只有一个来源，否则按后端链给出的顺序查，在线合成的结果优先
+        if self._synthesizer is not None:
+            return [self._key(text, "synthesizer", "mp3")]
+        return [self._key(text, name, format) for name, format in self._backends.Formats()]
+
+    def cached(self, text: str) -> io.BytesIO | None:
+        if self._cache is None:
+            return None
+        data = self._cache.GetAny(self._keys(text))
+        return io.BytesIO(data) if data is not None else None
+
+    def _store(self, key: str, data: bytes) -> None:
+        if self._cache is not None and len(data) > 0:
+            self._cache.Put(key, data)
+
     async def _load(self, text: str) -> tuple[bool, io.BytesIO | None]:
+        buf = self.cached(text)
+        if buf is not None:
+            return True, buf
+
+        return await self._synthesize(text)
+
+    async def _open(self, text: str) -> tuple[str, AsyncIterator[bytes]]:
+        '''
+        返回 (缓存的 key, 音频数据流)，key 由实际合成的后端和它的格式决定。
+        '''
+        if self._synthesizer is not None:
+            async def synthesize() -> AsyncIterator[bytes]:
+                yield self._synthesizer(text, self.voice, self.rate, self.volume)
+            return self._key(text, "synthesizer", "mp3"), synthesize()
+
+        backend, chunks = await self._backends.Open(text, self.voice, self.rate, self.volume)
+        return self._key(text, backend.name, backend.format), chunks
+
+    async def _synthesize(self, text: str) -> tuple[bool, io.BytesIO | None]:
         try:
-            # 创建 Communicate 对象
-            communicate = Communicate(text, voice=self.voice, rate=self.rate, volume=self.volume)
+            # 最后一次拼接，避免反复复制
+            key, stream = await self._open(text)
+            chunks: list[bytes] = [chunk async for chunk in stream]
+            audio_data = b"".join(chunks)
 
-            # 获取音频数据流
-            audio_data = b""
-            async for chunk in communicate.stream():
-                if chunk["type"] == "audio":
-                    audio_data += chunk["data"]
+            self._store(key, audio_data)
 
             # 使用 pygame 播放音频
             return True, io.BytesIO(audio_data)
+        except NoBackendError:
+            # BackendChain 已经提示过了
+            pass
         except Exception as e:
             print(f"Error: {type(e)} - {e}")
 
         return False, None
 
+    async def _stream(self, text: str, output: str | None = None) -> float | None:
+        '''
+        边下载边播放：收到的数据按 MP3 帧边界切成片段，带上前一段的最后几帧解码，依次排到保留的混音通道上。
+        第一段只要几帧就开始播放，后面的片段大一些，避免通道的等待队列被放空。
+        返回从开始到第一段开始播放的时间（秒），失败时返回 None。
+        '''
+        start = time.perf_counter()
+        try:
+            # 混音器没有初始化时这里就会出错，也要发出 SAY_FINISHED
+            player = _StreamPlayer(start)
+            cached = self.cached(text)
+            if cached is not None:
+                audio_data = cached.getvalue()
+                player.feed(audio_data)
+            else:
+                chunks: list[bytes] = []
+                pending = bytearray()
+                key, stream = await self._open(text)
+                async for data in stream:
+                    chunks.append(data)
+                    pending += data
+                    end, count = mp3.Split(pending)
+                    if count >= (self.firstFrames if player.firstSound is None else self.segmentFrames):
+                        player.feed(bytes(pending[:end]))
+                        del pending[:end]
+                    player.pump()
+
+                if len(pending) > 0:
+                    player.feed(bytes(pending))
+
+                audio_data = b"".join(chunks)
+                self._store(key, audio_data)
+
+            if output is not None:
+                with open(output, "wb") as f:
+                    f.write(audio_data)
+
+            while player.busy():
+                player.pump()
+                await asyncio.sleep(0.01)
+        except NoBackendError:
+            _notify(text, None)
+            return None
+        except Exception as e:
+            print(f"Error: {type(e)} - {e}")
+            _notify(text, None)
+            return None
+
+        if player.firstSound is not None:
+            logging.info(f"tts first sound after {player.firstSound * 1000:.0f}ms: {text}")
+        _notify(text, player.firstSound)
+        return player.firstSound
+
     async def _say(self, text: str, output: str | None = None) -> bool:
         ret, buf = await self._load(text)
+        return self._play(ret, buf, output)
+
+    def _play(self, ret: bool, buf: io.BytesIO | None, output: str | None) -> bool:
         if not ret or buf is None:
             return False
 
@@ -70,27 +251,111 @@ class SimpleTTS:
         return True
 
     def load(self, text: str) -> tuple[bool, io.BytesIO | None]:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        result = loop.run_until_complete(self._load(text))
-        loop.close()
+        # 命中缓存时不用创建事件循环
+        buf = self.cached(text)
+        if buf is not None:
+            return True, buf
+
+        return self.synthesize(text)
 
-        return result
+    def synthesize(self, text: str) -> tuple[bool, io.BytesIO | None]:
+        '''
+        不查缓存，直接在 TTSWorker 上合成，结果会写进缓存。
+        '''
+        return worker.run(self._synthesize(text)).result()
+
+    def submit(self, texts: Iterable[str]) -> list[Future]:
+        '''
+        把一批文字交给后台的 TTSWorker 并发合成，返回和 texts 一一对应的 Future，
+        结果和 load 一样是 (成功, 音频)。缓存命中的直接返回已完成的 Future。
+        '''
+        futures: list[Future] = []
+        for text in texts:
+            buf = self.cached(text)
+            if buf is not None:
+                future = Future()
+                future.set_result((True, buf))
+                futures.append(future)
+            else:
+                futures.append(worker.run(self._synthesize(text), limited=True))
+        return futures
     
     async def asyncLoad(self, text: str) -> Coroutine[Any, Any, tuple[bool, io.BytesIO | None]]:
         return self._load(text)
 
-    def say(self, text: str, output: str | None = None) -> bool:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        result = loop.run_until_complete(self._say(text, output))
-        loop.close()
+    def stream(self, text: str, output: str | None = None) -> Future:
+        '''
+        流式播放，马上返回。播放结束时发出 SAY_FINISHED 事件，Future 也在这时完成，结果是开始到第一段出声的秒数。
+        '''
+        return worker.run(self._stream(text, output))
+
+    def say(self, text: str, output: str | None = None, stream: bool = False) -> bool:
+        if stream:
+            self.stream(text, output)
+            return True
 
-        return result
+        # 在共享的事件循环里合成，在调用者的线程里播放和等待
+        ret, buf = self.load(text)
+        return self._play(ret, buf, output)
 
     async def asyncSay(self, text: str, output: str | None = None) -> Coroutine[Any, Any, bool]:
         return self._say(text, output)
     
+class TTSWorker:
+    '''
+    常驻的 TTS 线程，持有一个一直运行的事件循环，不用每次合成都创建和关闭事件循环。
+    通过 submit 提交的合成任务用信号量限制同时进行的请求数。
+    '''
+    def __init__(self, concurrency: int = 8):
+        self._concurrency = concurrency
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def _start(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                started = threading.Event()
+
+                def run():
+                    asyncio.set_event_loop(loop)
+                    self._semaphore = asyncio.Semaphore(self._concurrency)
+                    started.set()
+                    loop.run_forever()
+                    loop.close()
+
+                self._thread = threading.Thread(target=run, name="TTSWorker", daemon=True)
+                self._thread.start()
+                started.wait()
+                self._loop = loop
+            return self._loop
+
+    async def _limited(self, coroutine: Coroutine) -> Any:
+        async with self._semaphore:
+            return await coroutine
+
+    def run(self, coroutine: Coroutine, limited: bool = False) -> Future:
+        loop = self._start()
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("TTSWorker.run() called from the worker thread")
+        return asyncio.run_coroutine_threadsafe(self._limited(coroutine) if limited else coroutine, loop)
+
+    def submit(self, texts: Iterable[str], voice: str = "zh-CN-YunxiNeural", rate: str = "+0%", volume: str = "+0%") -> list[Future]:
+        return SimpleTTS(voice, rate, volume).submit(texts)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._loop is not None:
+                self._loop.call_soon_threadsafe(self._loop.stop)
+                self._thread.join()
+                self._loop = None
+                self._thread = None
+
+# 进程内共享的 TTS 线程
+worker = TTSWorker()
+
 if __name__ == "__main__":
     pygame.mixer.init(frequency=24000, size=-16, channels=1, buffer=2048)  # 设置采样率、位深度和声道数
     pygame.init()
@@ -98,4 +363,7 @@ if __name__ == "__main__":
     tts = SimpleTTS()
     tts.say("你好，世界")
     tts.say("徐晨皓你是最棒的", "edge-tts-demo.mp3")
+
+    firstSound = tts.stream("流式播放，收到第一段数据就开始出声").result()
+    print(f"first sound after {firstSound * 1000:.0f}ms" if firstSound is not None else "stream failed")
     # tts.asyncSay("你好，世界")
\ No newline at end of file
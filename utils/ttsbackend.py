@@ -0,0 +1,289 @@
+'''
+TTS 后端。
+
+EdgeBackend 调用 edge-tts（需要联网），LocalBackend 用 pyttsx3 调用系统自带的语音引擎（离线），
+StubBackend 不发声，按文字长度生成固定的静音 WAV，用于测试。
+
+BackendChain 按给出的顺序挑选后端：第一段数据超时或者出错的后端会被排到后面一段时间，
+自动换下一个后端。EdgeBackend 在请求之前先用很短的超时探测能不能连上服务器（结果会缓存一段时间），
+没网的时候不用等第一段数据超时，马上换成本地引擎。
+
+每个后端有自己的 format（mp3 或 wav），TTS 缓存按后端和格式分开保存。
+'''
+from __future__ import annotations
+import io
+import os
+import time
+import wave
+import asyncio
+import logging
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Iterable
+
+try:
+    from edge_tts import Communicate
+except ImportError:
+    Communicate = None
+
+try:
+    import pyttsx3
+except ImportError:
+    pyttsx3 = None
+
+class NoBackendError(RuntimeError):
+    '''
+    所有后端都不可用（没装或者都失败了）。
+    '''
+
+class Backend(ABC):
+    '''
+    后端接口：stream 按顺序产生 format 格式的音频数据，可以只产生一段。
+    '''
+    name = "backend"
+    format = "mp3"
+
+    def available(self) -> bool:
+        return True
+
+    async def probe(self) -> bool:
+        '''
+        请求之前的快速检查，默认总是可用。
+        '''
+        return True
+
+    @abstractmethod
+    def stream(self, text: str, voice: str, rate: str, volume: str) -> AsyncIterator[bytes]:
+        pass
+
+class EdgeBackend(Backend):
+    name = "edge"
+    format = "mp3"
+
+    def __init__(self, host: str = "speech.platform.bing.com", port: int = 443, probeTimeout: float = 0.5, probeInterval: float = 30.0):
+        self._host = host
+        self._port = port
+        self._probeTimeout = probeTimeout
+        self._probeInterval = probeInterval
+        # (探测结果, 过期时间)
+        self._probed: tuple[bool, float] | None = None
+
+    def available(self) -> bool:
+        return Communicate is not None
+
+    async def probe(self) -> bool:
+        '''
+        在 probeTimeout 内建立 TCP 连接就认为在线，结果缓存 probeInterval 秒。没网时 DNS 通常马上失败。
+        '''
+        now = time.monotonic()
+        if self._probed is not None and self._probed[1] > now:
+            return self._probed[0]
+
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(self._host, self._port), self._probeTimeout)
+            writer.close()
+            online = True
+        except (OSError, asyncio.TimeoutError):
+            online = False
+
+        self._probed = (online, time.monotonic() + self._probeInterval)
+        return online
+
+    async def stream(self, text: str, voice: str, rate: str, volume: str) -> AsyncIterator[bytes]:
+        communicate = Communicate(text, voice=voice, rate=rate, volume=volume)
+        async for chunk in communicate.stream():
+            if chunk["type"] == "audio":
+                yield chunk["data"]
+
+def _percent(value: str) -> float:
+    '''
+    edge-tts 的 "+10%" / "-20%" 转成 1.1 / 0.8。
+    '''
+    try:
+        return 1.0 + float(value.strip().rstrip("%")) / 100
+    except ValueError:
+        return 1.0
+
+class LocalBackend(Backend):
+    '''
+    pyttsx3 的引擎不是线程安全的，所有调用都放在同一个线程里，生成 WAV 后一次返回。
+    '''
+    name = "local"
+    format = "wav"
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="LocalTTS")
+        self._engine = None
+        self._rate: int | None = None
+        self._volume: float | None = None
+
+    def available(self) -> bool:
+        return pyttsx3 is not None
+
+    def _init(self):
+        if self._engine is None:
+            self._engine = pyttsx3.init()
+            self._rate = self._engine.getProperty("rate")
+            self._volume = self._engine.getProperty("volume")
+        return self._engine
+
+    def _voice(self, engine, voice: str) -> str | None:
+        # edge-tts 的语音名是 zh-CN-YunxiNeural 这样的格式，按语言前缀找一个本地语音
+        language = voice.split("-")[0].lower()
+        for v in engine.getProperty("voices"):
+            languages = [l.decode(errors="ignore") if isinstance(l, bytes) else str(l) for l in (v.languages or [])]
+            if any(language in l.lower() for l in languages) or language in v.id.lower():
+                return v.id
+        return None
+
+    def _synthesize(self, text: str, voice: str, rate: str, volume: str) -> bytes:
+        engine = self._init()
+        engine.setProperty("rate", int(self._rate * _percent(rate)))
+        engine.setProperty("volume", min(max(self._volume * _percent(volume), 0.0), 1.0))
+        voiceId = self._voice(engine, voice)
+        if voiceId is not None:
+            engine.setProperty("voice", voiceId)
+
+        fd, pathname = tempfile.mkstemp(suffix=".wav")
+        os.close(fd)
+        try:
+            engine.save_to_file(text, pathname)
+            engine.runAndWait()
+            with open(pathname, "rb") as f:
+                return f.read()
+        finally:
+            os.remove(pathname)
+
+    async def stream(self, text: str, voice: str, rate: str, volume: str) -> AsyncIterator[bytes]:
+        loop = asyncio.get_running_loop()
+        data = await loop.run_in_executor(self._executor, self._synthesize, text, voice, rate, volume)
+        if len(data) == 0:
+            raise RuntimeError("local engine produced no audio")
+        yield data
+
+class StubBackend(Backend):
+    '''
+    按文字长度生成静音 WAV，同样的输入总是得到同样的字节，calls 记录调用次数。
+    '''
+    name = "stub"
+    format = "wav"
+
+    def __init__(self, samplerate: int = 24000, secondsPerChar: float = 0.05):
+        self._samplerate = samplerate
+        self._secondsPerChar = secondsPerChar
+        self.calls = 0
+
+    async def stream(self, text: str, voice: str, rate: str, volume: str) -> AsyncIterator[bytes]:
+        self.calls += 1
+        frames = int(self._samplerate * self._secondsPerChar * max(len(text), 1))
+        buf = io.BytesIO()
+        with wave.open(buf, "wb") as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(self._samplerate)
+            f.writeframes(bytes(frames * 2))
+        yield buf.getvalue()
+
+class BackendChain:
+    '''
+    按给出的顺序依次尝试可用的后端。探测失败、第一段数据超过 timeout 或者出错的后端在 cooldown 秒内
+    排到正常的后端后面，只在其他后端都失败时才再试。测得的第一段数据延迟（指数滑动平均）只用于统计，
+    不影响顺序。已经开始产生数据以后出错不会再换后端，因为前面的数据可能已经播放了。
+    '''
+    def __init__(self, backends: Iterable[Backend], timeout: float = 1.5, cooldown: float = 30.0, smoothing: float = 0.3):
+        self._backends = list(backends)
+        self._timeout = timeout
+        self._cooldown = cooldown
+        self._smoothing = smoothing
+        self._latency: dict[str, float] = {}
+        self._demotedUntil: dict[str, float] = {}
+        # 没有可用后端时每次合成都会失败，只在第一次提示，有后端成功以后再重新提示
+        self._warned = False
+        self._lock = threading.Lock()
+
+    def Backends(self) -> list[Backend]:
+        '''
+        当前可用的后端，按选择顺序排列。
+        '''
+        now = time.monotonic()
+        with self._lock:
+            candidates = [
+                (self._demotedUntil.get(backend.name, 0.0) > now, i, backend)
+                for i, backend in enumerate(self._backends)
+                if backend.available()
+            ]
+        return [backend for _, _, backend in sorted(candidates, key=lambda c: (c[0], c[1]))]
+
+    def Formats(self) -> list[tuple[str, str]]:
+        '''
+        所有后端的 (名字, 格式)，按给出的顺序，用来查缓存。
+        '''
+        return [(backend.name, backend.format) for backend in self._backends]
+
+    def Stats(self) -> dict[str, dict[str, float | bool]]:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                backend.name: {
+                    "available": backend.available() and self._demotedUntil.get(backend.name, 0.0) <= now,
+                    "latency": self._latency.get(backend.name, 0.0),
+                }
+                for backend in self._backends
+            }
+
+    def _succeeded(self, backend: Backend, latency: float) -> None:
+        with self._lock:
+            self._warned = False
+            self._demotedUntil.pop(backend.name, None)
+            previous = self._latency.get(backend.name)
+            self._latency[backend.name] = latency if previous is None else previous + self._smoothing * (latency - previous)
+
+    def _failed(self, backend: Backend, e: BaseException) -> None:
+        logging.warning(f"tts backend {backend.name} failed: {type(e)} - {e}")
+        with self._lock:
+            self._demotedUntil[backend.name] = time.monotonic() + self._cooldown
+
+    async def Open(self, text: str, voice: str, rate: str, volume: str) -> tuple[Backend, AsyncIterator[bytes]]:
+        '''
+        选出第一个能在 timeout 内产生数据的后端，返回 (后端, 音频数据)，数据里已经包含第一段。
+        '''
+        for backend in self.Backends():
+            if not await backend.probe():
+                self._failed(backend, ConnectionError("probe failed"))
+                continue
+
+            start = time.perf_counter()
+            iterator = backend.stream(text, voice, rate, volume).__aiter__()
+            try:
+                first = await asyncio.wait_for(iterator.__anext__(), self._timeout)
+            except StopAsyncIteration:
+                self._failed(backend, RuntimeError("no audio"))
+                continue
+            except Exception as e:
+                self._failed(backend, e)
+                await iterator.aclose()
+                continue
+
+            self._succeeded(backend, time.perf_counter() - start)
+            return backend, _prepend(first, iterator)
+
+        with self._lock:
+            warn, self._warned = not self._warned, True
+        if warn:
+            logging.warning("no tts backend available, words without recorded pronunciations will be silent")
+        raise NoBackendError("no tts backend available")
+
+    async def stream(self, text: str, voice: str, rate: str, volume: str) -> AsyncIterator[bytes]:
+        _, chunks = await self.Open(text, voice, rate, volume)
+        async for data in chunks:
+            yield data
+
+async def _prepend(first: bytes, iterator: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    yield first
+    async for data in iterator:
+        yield data
+
+# 默认先用 edge-tts，没网或者太慢时用本地引擎
+backends = BackendChain([EdgeBackend(), LocalBackend()])
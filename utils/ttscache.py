@@ -0,0 +1,203 @@
+'''
+TTS 合成结果的磁盘缓存。
+
+文件名是 (text, voice, rate, volume, 后端) 的哈希加上音频格式的扩展名，按哈希前两位分目录保存，先写临时文件再替换，
+进程中途退出也不会留下半个文件。index.db 记录每个文件的大小和最后访问时间，
+总大小超过预算时按最久未访问的顺序删除。命中时的访问时间先记在内存里，攒够一批、淘汰之前或者关闭时才写进 index.db，
+读缓存时不写数据库。
+'''
+from __future__ import annotations
+import os
+import time
+import logging
+import hashlib
+import sqlite3
+import tempfile
+import threading
+from typing import Iterable
+
+_index_create_table = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    access REAL NOT NULL
+);
+"""
+
+_index_create_index = """
+CREATE INDEX IF NOT EXISTS entries_access ON entries (access);
+"""
+
+class AudioCache:
+    def __init__(self, root: str | os.PathLike = os.path.join("cache", "tts"), budget: int = 256 * 1024 * 1024, flushSize: int = 256):
+        self._root = root
+        self._budget = budget
+        self._flushSize = flushSize
+        self._lock = threading.Lock()
+        self._connection: sqlite3.Connection | None = None
+        # 还没写进 index.db 的访问记录：key -> (大小, 访问时间)
+        self._accessed: dict[str, tuple[int, float]] = {}
+        self._size = 0
+        self._hits = 0
+        self._misses = 0
+
+    @property
+    def hits(self) -> int:
+        return self._hits
+
+    @property
+    def misses(self) -> int:
+        return self._misses
+
+    @staticmethod
+    def Key(text: str, voice: str, rate: str, volume: str, backend: str = "edge", format: str = "mp3") -> str:
+        '''
+        不同后端合成的声音不一样，格式也可能不同（edge 是 MP3，本地引擎是 WAV），分开保存。
+        '''
+        digest = hashlib.sha1("\x1f".join([text, voice, rate, volume, backend]).encode()).hexdigest()
+        return f"{digest}.{format}"
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self._root, key[:2], key)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            os.makedirs(self._root, exist_ok=True)
+            self._connection = sqlite3.connect(os.path.join(self._root, "index.db"), check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(_index_create_table)
+            self._connection.execute(_index_create_index)
+            self._connection.commit()
+            self._size = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchall()[0][0]
+        return self._connection
+
+    def Get(self, key: str) -> bytes | None:
+        with self._lock:
+            connection = self._connect()
+            try:
+                with open(self._path(key), "rb") as f:
+                    data = f.read()
+            except FileNotFoundError:
+                # 文件被删掉了，索引也一起删掉
+                self._accessed.pop(key, None)
+                with connection:
+                    cursor = connection.execute("DELETE FROM entries WHERE key = ? RETURNING size", (key,))
+                    for size, in cursor.fetchall():
+                        self._size -= size
+                self._misses += 1
+                return None
+
+            self._accessed[key] = (len(data), time.time())
+            if len(self._accessed) >= self._flushSize:
+                self._flush(connection)
+            self._hits += 1
+            return data
+
+    def _flush(self, connection: sqlite3.Connection) -> None:
+        '''
+        把攒下的访问时间一次写进 index.db。
+        '''
+        if len(self._accessed) == 0:
+            return
+
+        accessed, self._accessed = self._accessed, {}
+        with connection:
+            connection.executemany(
+                "INSERT INTO entries (key, size, access) VALUES (?, ?, ?) ON CONFLICT(key) DO UPDATE SET access = excluded.access",
+                [(key, size, access) for key, (size, access) in accessed.items()],
+            )
+
+    def GetAny(self, keys: Iterable[str]) -> bytes | None:
+        '''
+        返回第一个存在的 key 的数据，只计一次命中或者未命中。
+        '''
+        with self._lock:
+            self._connect()
+            keys = [key for key in keys if os.path.exists(self._path(key))]
+            if len(keys) == 0:
+                self._misses += 1
+                return None
+        return self.Get(keys[0])
+
+    def Put(self, key: str, data: bytes) -> None:
+        if len(data) > self._budget:
+            return
+
+        with self._lock:
+            connection = self._connect()
+            pathname = self._path(key)
+            os.makedirs(os.path.dirname(pathname), exist_ok=True)
+            fd, tmpname = tempfile.mkstemp(dir=os.path.dirname(pathname), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(tmpname, pathname)
+            except Exception as e:
+                logging.error(f"{type(e)} - {e}")
+                if os.path.exists(tmpname):
+                    os.remove(tmpname)
+                return
+
+            self._accessed.pop(key, None)
+            with connection:
+                cursor = connection.execute("SELECT size FROM entries WHERE key = ?", (key,))
+                for size, in cursor.fetchall():
+                    self._size -= size
+                connection.execute(
+                    "INSERT INTO entries (key, size, access) VALUES (?, ?, ?) ON CONFLICT(key) DO UPDATE SET size = excluded.size, access = excluded.access",
+                    (key, len(data), time.time()),
+                )
+            self._size += len(data)
+
+            if self._size > self._budget:
+                self._evict(connection)
+
+    def _evict(self, connection: sqlite3.Connection) -> None:
+        '''
+        删除最久未访问的文件，直到总大小回到预算以内。
+        '''
+        self._flush(connection)
+        removed: list[str] = []
+        for key, size in connection.execute("SELECT key, size FROM entries ORDER BY access").fetchall():
+            if self._size <= self._budget:
+                break
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+            removed.append(key)
+            self._size -= size
+
+        with connection:
+            connection.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key in removed])
+
+    def Size(self) -> int:
+        with self._lock:
+            self._connect()
+            return self._size
+
+    def Stats(self) -> dict[str, int]:
+        with self._lock:
+            self._connect()
+            return {"hits": self._hits, "misses": self._misses, "size": self._size, "budget": self._budget}
+
+    def Close(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                self._flush(self._connection)
+                self._connection.close()
+                self._connection = None
+
+class StubSynthesizer:
+    '''
+    不联网的合成器，返回由参数决定的固定字节，并记录调用次数，用来检查缓存命中率。
+    '''
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, text: str, voice: str, rate: str, volume: str) -> bytes:
+        self.calls += 1
+        return AudioCache.Key(text, voice, rate, volume).encode()
+
+# 进程内共享的 TTS 缓存
+cache = AudioCache()